@@ -0,0 +1,72 @@
+"""
+Audio siyosatlari: mp3 (har doim 192k ga qayta kodlash) va native (AAC nusxa, .m4a).
+Har bir video uchun yuklash + postprocess ning umumiy vaqti va CPU soniyalari o'lchanadi
+(bot jarayoni + ffmpeg kabi bola jarayonlar). Telegramga yuborish kirmaydi.
+
+    python -m benchmarks.bench_audio_policy --runs 2 dQw4w9WgXcQ kJQP7kiw5Fk
+"""
+import argparse
+import asyncio
+import resource
+import statistics
+import time
+
+from services.media_downloader import AUDIO_POLICIES
+from services.youtube_service import YouTubeService
+from utils.cleanup import cleanup_prefix
+
+DEFAULT_VIDEOS = ["dQw4w9WgXcQ", "kJQP7kiw5Fk", "JGwWNGJdvx8"]
+
+
+def _cpu_seconds() -> float:
+    """Joriy jarayon + tugagan bola jarayonlar (ffmpeg) CPU vaqti."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+async def _measure(svc: YouTubeService, policy: str, videos: list[str], runs: int) -> list[tuple[float, float, int]]:
+    results = []
+    for run in range(runs):
+        for vid in videos:
+            prefix = f"bench_{policy}_{vid}_{run}"
+            cpu0, t0 = _cpu_seconds(), time.perf_counter()
+            try:
+                audio = await svc.download_mp3_with_cover(
+                    f"https://www.youtube.com/watch?v={vid}", prefix, policy=policy
+                )
+            except Exception as e:
+                print(f"  [{policy}] {vid}: {e}")
+                audio = None
+            wall, cpu = time.perf_counter() - t0, _cpu_seconds() - cpu0
+            if audio:
+                results.append((wall, cpu, audio.path.stat().st_size))
+            else:
+                print(f"  [{policy}] {vid}: yuklanmadi")
+            cleanup_prefix(prefix)
+    return results
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="*", default=DEFAULT_VIDEOS)
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--policies", nargs="+", default=list(AUDIO_POLICIES), choices=list(AUDIO_POLICIES))
+    args = parser.parse_args()
+
+    svc = YouTubeService()
+    for policy in args.policies:
+        results = await _measure(svc, policy, args.videos, args.runs)
+        if not results:
+            print(f"{policy:>6}: natija yo'q")
+            continue
+        walls, cpus, sizes = zip(*results)
+        print(
+            f"{policy:>6}: n={len(results)} "
+            f"latency median={statistics.median(walls):.2f}s max={max(walls):.2f}s "
+            f"cpu median={statistics.median(cpus):.2f}s total={sum(cpus):.1f}s "
+            f"size median={statistics.median(sizes) / 1024 / 1024:.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
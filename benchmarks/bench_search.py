@@ -0,0 +1,46 @@
+"""
+YouTube qidiruv tezligi: flat (faqat metadata) va full (har bir natija to'liq extract) rejimlari.
+Cache chetlab o'tiladi – har safar haqiqiy yt-dlp so'rovi.
+
+    python -m benchmarks.bench_search --runs 3 "Eminem Lose Yourself" "Adele Hello"
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from services.youtube_service import YouTubeService
+
+DEFAULT_QUERIES = ["Eminem Lose Yourself", "Adele Hello", "Shaxriyor Yomg'ir"]
+
+
+async def _measure(svc: YouTubeService, mode: str, queries: list[str], runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        for q in queries:
+            t0 = time.perf_counter()
+            results = await svc._search_live(q, mode=mode)
+            timings.append(time.perf_counter() - t0)
+            if not results:
+                print(f"  [{mode}] {q!r}: natija yo'q")
+    return timings
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    svc = YouTubeService()
+    for mode in ("flat", "full"):
+        timings = await _measure(svc, mode, args.queries, args.runs)
+        print(
+            f"{mode:>4}: n={len(timings)} "
+            f"median={statistics.median(timings):.2f}s "
+            f"min={min(timings):.2f}s max={max(timings):.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
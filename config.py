@@ -86,6 +86,102 @@ FFPROBE_LOCATION = _find_ffprobe_exe()
 
 # Internal limits (invisible to user)
 USER_PARALLEL_LIMIT = 2
-GLOBAL_PARALLEL_LIMIT = 5
-REQUEST_DELAY_SEC = 0.3
-REQUEST_DELAY_SECONDS = REQUEST_DELAY_SEC
+GLOBAL_PARALLEL_LIMIT = int(os.getenv("GLOBAL_PARALLEL_LIMIT", "5"))
+
+# So'rovlar tezligi (token bucket, utils/rate_limit.py): har bir user – daqiqasiga RATE_USER_PER_MIN, bir zumda
+# RATE_USER_BURST tagacha; butun bot – soniyasiga RATE_GLOBAL_PER_SEC, RATE_GLOBAL_BURST tagacha.
+# Token bo'lmasa kutiladi; kutish RATE_MAX_WAIT_SEC dan oshsa so'rov rad etiladi
+RATE_USER_PER_MIN = float(os.getenv("RATE_USER_PER_MIN", "20"))
+RATE_USER_BURST = int(os.getenv("RATE_USER_BURST", "6"))
+RATE_GLOBAL_PER_SEC = float(os.getenv("RATE_GLOBAL_PER_SEC", "10"))
+RATE_GLOBAL_BURST = int(os.getenv("RATE_GLOBAL_BURST", "30"))
+RATE_MAX_WAIT_SEC = float(os.getenv("RATE_MAX_WAIT_SEC", "3"))
+
+# YouTube qidiruv natijalari cache (TTL + LRU); PERSIST=1 – SQLite da ham saqlanadi (restartdan keyin ham)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+SEARCH_CACHE_TTL_SEC = int(os.getenv("SEARCH_CACHE_TTL_SEC", str(6 * 3600)))
+SEARCH_CACHE_PERSIST = os.getenv("SEARCH_CACHE_PERSIST", "1") == "1"
+# "flat" – tez qidiruv (faqat id/title/duration), "full" – har bir natija to'liq extract qilinadi
+SEARCH_MODE = os.getenv("SEARCH_MODE", "flat")
+
+# Shazam: bir so'rovda bir vaqtda yuboriladigan segmentlar soni (1 = ketma-ket) va butun bot bo'yicha
+# Shazam serveriga parallel so'rovlar chegarasi (fan-out upstream yuklamani oshirib yubormasligi uchun)
+SHAZAM_FANOUT = int(os.getenv("SHAZAM_FANOUT", "3"))
+SHAZAM_GLOBAL_BUDGET = int(os.getenv("SHAZAM_GLOBAL_BUDGET", "8"))
+
+# Shazam natijalari cache: topilgan trek uzoq saqlanadi, "topilmadi" esa qisqa muddat
+SHAZAM_CACHE_TTL_SEC = int(os.getenv("SHAZAM_CACHE_TTL_SEC", str(30 * 24 * 3600)))
+SHAZAM_NEGATIVE_TTL_SEC = int(os.getenv("SHAZAM_NEGATIVE_TTL_SEC", "600"))
+
+# Tugmalar holati (Shazam natijasi, media link): xotirada nechta yozuv, qancha saqlanadi, SQLite ga yozilsinmi
+STATE_MEMORY_SIZE = int(os.getenv("STATE_MEMORY_SIZE", "5000"))
+STATE_TTL_SEC = int(os.getenv("STATE_TTL_SEC", str(3 * 24 * 3600)))
+STATE_PERSIST = os.getenv("STATE_PERSIST", "1") == "1"
+
+# Adaptiv global limit (utils/adaptive_limit.py, AIMD): yuklashlar birinchi baytgacha p95 vaqti va yt-dlp xatolari
+# sog'lom bo'lsa limit +1, yomonlashsa ×ADAPTIVE_BACKOFF. GLOBAL_PARALLEL_LIMIT – boshlang'ich qiymat.
+# ADAPTIVE_LIMIT=0 – o'chirilgan
+ADAPTIVE_LIMIT = os.getenv("ADAPTIVE_LIMIT", "1") == "1"
+GLOBAL_PARALLEL_MIN = int(os.getenv("GLOBAL_PARALLEL_MIN", "2"))
+GLOBAL_PARALLEL_MAX = int(os.getenv("GLOBAL_PARALLEL_MAX", "16"))
+ADAPTIVE_LATENCY_TARGET_SEC = float(os.getenv("ADAPTIVE_LATENCY_TARGET_SEC", "15"))
+ADAPTIVE_ERROR_RATE = float(os.getenv("ADAPTIVE_ERROR_RATE", "0.2"))
+ADAPTIVE_WINDOW = int(os.getenv("ADAPTIVE_WINDOW", "20"))
+ADAPTIVE_BACKOFF = float(os.getenv("ADAPTIVE_BACKOFF", "0.7"))
+
+# Platforma bo'yicha parallel limit (utils/platform_limits.py): PLATFORM_LIMITS="YouTube=8,Instagram=3"
+# Circuit breaker: oxirgi BREAKER_WINDOW natijadan (kamida BREAKER_MIN_CALLS) xato ulushi BREAKER_ERROR_RATE dan oshsa
+# platforma BREAKER_COOLDOWN_SEC ga o'chiriladi, keyin bitta sinov so'rovi (half-open)
+PLATFORM_PARALLEL_LIMIT = int(os.getenv("PLATFORM_PARALLEL_LIMIT", "4"))
+PLATFORM_LIMITS = {
+    name.strip(): int(value)
+    for name, _, value in (
+        item.partition("=") for item in os.getenv("PLATFORM_LIMITS", "YouTube=8").split(",") if "=" in item
+    )
+}
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN_SEC = float(os.getenv("BREAKER_COOLDOWN_SEC", "60"))
+
+# Yuklash vazifalari navbati (utils/jobs.py): JOB_QUEUE=1 – handlerlar vazifani SQLite ga yozadi,
+# ularni alohida `python worker.py` jarayonlari bajaradi (bir nechta bo'lishi mumkin). 0 – handler ichida bajariladi
+JOB_QUEUE = os.getenv("JOB_QUEUE", "0") == "1"
+# Worker tugma holatini (masalan media havolasi) SQLite orqali botga beradi – xotiradagi holat bot ko'rmaydi
+if JOB_QUEUE and not STATE_PERSIST:
+    raise ValueError("JOB_QUEUE=1 requires STATE_PERSIST=1 (workers share button state with the bot via SQLite)")
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+JOB_LEASE_SEC = float(os.getenv("JOB_LEASE_SEC", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY_SEC = float(os.getenv("JOB_RETRY_DELAY_SEC", "10"))
+JOB_POLL_SEC = float(os.getenv("JOB_POLL_SEC", "1"))
+JOB_RETENTION_SEC = int(os.getenv("JOB_RETENTION_SEC", str(7 * 24 * 3600)))
+# Muddati o'tgan kv_cache yozuvlari (qidiruv cache, holat) va eski vazifalar shu oraliqda o'chiriladi (bot jarayonida)
+DB_PURGE_INTERVAL_SEC = float(os.getenv("DB_PURGE_INTERVAL_SEC", "3600"))
+
+# MP3: AUDIO_STREAM_UPLOAD=1 – YouTube audio oqimi ffmpeg orqali to'g'ridan-to'g'ri Telegramga yuboriladi
+# (diskka yozilmaydi); muvaffaqiyatsiz bo'lsa odatiy yuklash + fayl yo'li
+AUDIO_STREAM_UPLOAD = os.getenv("AUDIO_STREAM_UPLOAD", "1") == "1"
+
+# Audio chiqish formati: mp3 – har doim MP3 192k ga qayta kodlash;
+# native – AAC manba (.m4a) qayta kodlanmasdan nusxalanadi (Telegram o'ynata oladi), boshqasi AAC ga o'giriladi
+AUDIO_OUTPUT = os.getenv("AUDIO_OUTPUT", "mp3").strip().lower()
+
+# Bir vaqtda Telegramga yuborilayotgan fayllar hajmi chegarasi (utils/uploads.py); oshsa – yuborish navbat kutadi
+UPLOAD_BYTES_BUDGET = int(float(os.getenv("UPLOAD_BYTES_BUDGET_MB", "200")) * 1024 * 1024)
+
+# Prometheus /metrics (utils/metrics.py): webhook rejimida PORT dagi asosiy serverda;
+# polling da METRICS_PORT (bo'lmasa PORT), worker.py da faqat METRICS_PORT (0 – o'chirilgan)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Vazifa bosqichlari trace (utils/tracing.py): shu ulushdagi vazifalar uchun bitta JSON qator (0 – o'chirilgan)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+
+# Executorlar (utils/executors.py): har bir ish turi o'z pool ida, bir-birini bloklamaydi.
+# CPU_POOL_SIZE – ffmpeg/hash ishlari uchun thread pool (bir vaqtdagi ffmpeg jarayonlari); 0 = CPU yadrolari soni
+SEARCH_POOL_SIZE = int(os.getenv("SEARCH_POOL_SIZE", "4"))
+METADATA_POOL_SIZE = int(os.getenv("METADATA_POOL_SIZE", "8"))
+DOWNLOAD_POOL_SIZE = int(os.getenv(
+    "DOWNLOAD_POOL_SIZE", str(GLOBAL_PARALLEL_MAX if ADAPTIVE_LIMIT else GLOBAL_PARALLEL_LIMIT)
+))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", "0")) or (os.cpu_count() or 2)
@@ -1,4 +1,6 @@
 """SQLite database for users and logs (async aiosqlite)."""
+import time
+
 import aiosqlite
 from pathlib import Path
 
@@ -13,8 +15,10 @@ class Database:
 
     async def connect(self) -> None:
         DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        self._connection = await aiosqlite.connect(DB_PATH)
+        # Bot va worker jarayonlari bitta faylni ishlatadi: WAL + kutish (database is locked o'rniga)
+        self._connection = await aiosqlite.connect(DB_PATH, timeout=30)
         self._connection.row_factory = aiosqlite.Row
+        await self._connection.execute("PRAGMA journal_mode=WAL")
         await self._init_tables()
 
     async def _init_tables(self) -> None:
@@ -65,6 +69,55 @@ class Database:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        await self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS file_cache (
+                platform TEXT NOT NULL,
+                media_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                media_type TEXT NOT NULL,
+                title TEXT,
+                artist TEXT,
+                duration INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (platform, media_id, kind)
+            )
+        """)
+        await self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS kv_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        # Davriy kv_purge_expired uchun
+        await self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_kv_cache_expires ON kv_cache (expires_at)"
+        )
+        await self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                status_message_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                lease_owner TEXT,
+                lease_until REAL,
+                run_after REAL NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        await self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after)"
+        )
         await self._connection.commit()
 
     async def get_user_language(self, user_id: int) -> str:
@@ -196,6 +249,186 @@ class Database:
             for r in rows
         ]
 
+    # ----- Telegram file_id cache -----
+    async def get_cached_file(self, platform: str, media_id: str, kind: str) -> dict | None:
+        cursor = await self._connection.execute(
+            """SELECT file_id, media_type, title, artist, duration FROM file_cache
+               WHERE platform = ? AND media_id = ? AND kind = ?""",
+            (platform, media_id, kind),
+        )
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+    async def set_cached_file(
+        self,
+        platform: str,
+        media_id: str,
+        kind: str,
+        file_id: str,
+        media_type: str,
+        title: str = "",
+        artist: str = "",
+        duration: int | None = None,
+    ) -> None:
+        await self._connection.execute(
+            """INSERT OR REPLACE INTO file_cache
+               (platform, media_id, kind, file_id, media_type, title, artist, duration)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (platform, media_id, kind, file_id, media_type, title or "", artist or "", duration),
+        )
+        await self._connection.commit()
+
+    async def delete_cached_file(self, platform: str, media_id: str, kind: str) -> None:
+        await self._connection.execute(
+            "DELETE FROM file_cache WHERE platform = ? AND media_id = ? AND kind = ?",
+            (platform, media_id, kind),
+        )
+        await self._connection.commit()
+
+    # ----- Umumiy key-value cache (TTL, unix vaqt) -----
+    async def kv_get(self, namespace: str, key: str) -> str | None:
+        cursor = await self._connection.execute(
+            "SELECT value FROM kv_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time()),
+        )
+        row = await cursor.fetchone()
+        return row["value"] if row else None
+
+    async def kv_set(self, namespace: str, key: str, value: str, ttl: float) -> None:
+        await self._connection.execute(
+            "INSERT OR REPLACE INTO kv_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, time.time() + ttl),
+        )
+        await self._connection.commit()
+
+    async def kv_delete(self, namespace: str, key: str) -> None:
+        await self._connection.execute(
+            "DELETE FROM kv_cache WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+        await self._connection.commit()
+
+    async def kv_purge_expired(self) -> int:
+        cursor = await self._connection.execute(
+            "DELETE FROM kv_cache WHERE expires_at <= ?", (time.time(),)
+        )
+        await self._connection.commit()
+        return cursor.rowcount
+
+    # ----- Navbat (jobs): bot qo'shadi, worker jarayonlari lease bilan oladi -----
+    async def enqueue_job(
+        self,
+        job_type: str,
+        payload: str,
+        user_id: int,
+        chat_id: int,
+        status_message_id: int | None,
+        max_attempts: int = 3,
+    ) -> int:
+        now = time.time()
+        cursor = await self._connection.execute(
+            """INSERT INTO jobs (type, payload, user_id, chat_id, status_message_id, max_attempts, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_type, payload, user_id, chat_id, status_message_id, max_attempts, now, now),
+        )
+        await self._connection.commit()
+        return cursor.lastrowid
+
+    async def claim_job(self, owner: str, lease_sec: float) -> dict | None:
+        """
+        Navbatdagi (yoki lease muddati o'tgan) eng eski vazifani olish. Bitta UPDATE – bir nechta worker
+        bir vazifani ikki marta ololmaydi. owner har bir claim uchun noyob bo'lishi kerak.
+        """
+        now = time.time()
+        cursor = await self._connection.execute(
+            """UPDATE jobs SET status = 'running', lease_owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?
+               WHERE id = (
+                   SELECT id FROM jobs
+                   WHERE (status = 'queued' AND run_after <= ?)
+                      OR (status = 'running' AND lease_until < ? AND attempts < max_attempts)
+                   ORDER BY id LIMIT 1
+               )""",
+            (owner, now + lease_sec, now, now, now),
+        )
+        await self._connection.commit()
+        if not cursor.rowcount:
+            return None
+        cursor = await self._connection.execute(
+            "SELECT * FROM jobs WHERE lease_owner = ? AND status = 'running'", (owner,)
+        )
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+    async def expire_jobs(self, owner: str) -> list[dict]:
+        """
+        Lease muddati o'tgan va urinishlari tugagan vazifalarni 'failed' qilish. Bitta UPDATE owner bilan
+        belgilaydi – har bir vazifa faqat bitta worker ga qaytadi (foydalanuvchiga bir marta xabar beriladi).
+        """
+        now = time.time()
+        cursor = await self._connection.execute(
+            """UPDATE jobs SET status = 'failed', lease_owner = ?, lease_until = NULL, error = 'lease expired',
+                   updated_at = ?
+               WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts""",
+            (owner, now, now),
+        )
+        await self._connection.commit()
+        if not cursor.rowcount:
+            return []
+        cursor = await self._connection.execute(
+            "SELECT * FROM jobs WHERE lease_owner = ? AND status = 'failed'", (owner,)
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+    async def extend_job_lease(self, job_id: int, owner: str, lease_sec: float) -> bool:
+        now = time.time()
+        cursor = await self._connection.execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (now + lease_sec, now, job_id, owner),
+        )
+        await self._connection.commit()
+        return cursor.rowcount > 0
+
+    async def complete_job(self, job_id: int, owner: str) -> None:
+        await self._connection.execute(
+            """UPDATE jobs SET status = 'done', lease_owner = NULL, lease_until = NULL, updated_at = ?
+               WHERE id = ? AND lease_owner = ?""",
+            (time.time(), job_id, owner),
+        )
+        await self._connection.commit()
+
+    async def fail_job(self, job_id: int, owner: str, error: str, retry_delay: float | None) -> bool:
+        """retry_delay=None yoki urinishlar tugagan bo'lsa – 'failed'. True – qayta navbatga qo'yildi."""
+        now = time.time()
+        if retry_delay is not None:
+            cursor = await self._connection.execute(
+                """UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_until = NULL, run_after = ?,
+                       error = ?, updated_at = ?
+                   WHERE id = ? AND lease_owner = ? AND attempts < max_attempts""",
+                (now + retry_delay, error, now, job_id, owner),
+            )
+            if cursor.rowcount:
+                await self._connection.commit()
+                return True
+        await self._connection.execute(
+            """UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_until = NULL, error = ?, updated_at = ?
+               WHERE id = ? AND lease_owner = ?""",
+            (error, now, job_id, owner),
+        )
+        await self._connection.commit()
+        return False
+
+    async def job_counts(self) -> dict[str, int]:
+        cursor = await self._connection.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+        rows = await cursor.fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    async def purge_jobs(self, older_than_sec: float) -> int:
+        cursor = await self._connection.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - older_than_sec,),
+        )
+        await self._connection.commit()
+        return cursor.rowcount
+
     async def close(self) -> None:
         if self._connection:
             await self._connection.close()
@@ -1,27 +1,32 @@
 """Instagram, TikTok, Pinterest, Facebook — link yuborilgach tanlash menyusi (Video / MP3 / Qo'shiqni topish)."""
 import logging
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram import Bot, Router, F
+from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
 
+from config import STATE_MEMORY_SIZE, STATE_TTL_SEC, STATE_PERSIST
 from database import get_db
-from services import MediaDownloaderService, ShazamService
+from services import MediaDownloaderService, ShazamService, FileTooLarge
 from keyboards.inline import build_shazam_result_keyboard
 from utils.locales import get_text
 from utils.queue_manager import queue_manager
 from utils.cleanup import cleanup_temp_file
 from utils.url_extract import get_first_url_from_message, get_youtube_id_from_message
 from utils.shazam_cache import set_track
+from utils.state_store import StateStore
+from utils import jobs, recognition_cache
 from utils.filename import sanitize_audio_filename
+from utils.delivery import deliver_video
+from utils.uploads import send_from_disk
 
 router = Router(name="media")
 media_svc = MediaDownloaderService()
 shazam_svc = ShazamService()
 logger = logging.getLogger(__name__)
 
-# (user_id, message_id) -> url
-_media_pending: dict[tuple[int, int], str] = {}
+# "user_id:message_id" -> url (tugmalar redeploydan keyin ham ishlashi uchun SQLite da ham saqlanadi)
+_media_pending = StateStore("media_pending", STATE_MEMORY_SIZE, STATE_TTL_SEC, persist=STATE_PERSIST)
 
 
 def _build_media_keyboard(lang: str):
@@ -55,15 +60,6 @@ def _has_non_yt_link(message: Message) -> bool:
     return get_first_url_from_message(message) is not None
 
 
-def _send_media_by_path(message: Message, path):
-    """Fayl turiga qarab video yoki document yuboradi. FSInputFile – katta fayllar xotiraga yuklanmaydi."""
-    video_ext = (".mp4", ".webm", ".mov", ".mkv", ".avi")
-    inp = FSInputFile(path)
-    if path.suffix.lower() in video_ext:
-        return message.answer_video(inp)
-    return message.answer_document(inp)
-
-
 @router.message(F.text | F.caption, _has_non_yt_link)
 async def on_link(message: Message) -> None:
     url = get_first_url_from_message(message)
@@ -77,7 +73,7 @@ async def on_link(message: Message) -> None:
         db = get_db()
         lang = await db.get_user_language(user_id)
         status = await message.answer("⏳", parse_mode="HTML")
-        _media_pending[(user_id, status.message_id)] = url
+        await _put_pending(user_id, status.message_id, url)
         text = get_text(lang, "media_choose", platform=platform)
         await status.edit_text(text, reply_markup=_build_media_keyboard(lang), parse_mode="HTML")
     except Exception as e:
@@ -88,18 +84,43 @@ async def on_link(message: Message) -> None:
             pass
 
 
-def _get_pending(callback: CallbackQuery) -> str | None:
-    key = (callback.from_user.id, callback.message.message_id)
-    return _media_pending.pop(key, None)
+async def _get_pending(callback: CallbackQuery) -> str | None:
+    return await _media_pending.pop(f"{callback.from_user.id}:{callback.message.message_id}")
+
 
+async def _put_pending(user_id: int, message_id: int, url: str) -> None:
+    await _media_pending.set(f"{user_id}:{message_id}", url)
 
-def _put_pending(user_id: int, message_id: int, url: str) -> None:
-    _media_pending[(user_id, message_id)] = url
+
+@jobs.runner(jobs.MEDIA_VIDEO)
+async def run_media_video_job(bot: Bot, job: jobs.Job) -> None:
+    url, lang = job.payload["url"], job.lang
+    prefix = f"md_v_{job.user_id}_{job.status_message_id}"
+    try:
+        sent = await deliver_video(
+            bot, job.chat_id, job.user_id,
+            media_svc.detect_platform(url) or "Other", media_svc.canonical_id(url),
+            lambda: media_svc.download_video_or_image(url, prefix),
+        )
+        key = "yt_done_keep" if sent else "error_friendly"
+    except FileTooLarge:
+        key = "file_too_big"
+    await jobs.after_send(
+        job,
+        bot.edit_message_text(
+            get_text(lang, key),
+            chat_id=job.chat_id,
+            message_id=job.status_message_id,
+            reply_markup=_build_media_keyboard(lang),
+            parse_mode="HTML",
+        ),
+        _put_pending(job.user_id, job.status_message_id, url),
+    )
 
 
 @router.callback_query(F.data == "md_v")
 async def on_media_video(callback: CallbackQuery) -> None:
-    url = _get_pending(callback)
+    url = await _get_pending(callback)
     if not url:
         await callback.answer(get_text("uz", "error_friendly"), show_alert=True)
         return
@@ -109,40 +130,23 @@ async def on_media_video(callback: CallbackQuery) -> None:
         db = get_db()
         lang = await db.get_user_language(user_id)
         await callback.message.edit_text("⏳", parse_mode="HTML")
-        async with queue_manager(user_id):
-            prefix = f"md_v_{user_id}_{callback.message.message_id}"
-            path = await media_svc.download_video_or_image(url, prefix)
-            if path and path.exists():
-                try:
-                    await _send_media_by_path(callback.message, path)
-                    await callback.message.edit_text(
-                        get_text(lang, "yt_done_keep"),
-                        reply_markup=_build_media_keyboard(lang),
-                        parse_mode="HTML",
-                    )
-                finally:
-                    cleanup_temp_file(path)
-                _put_pending(user_id, callback.message.message_id, url)
-            else:
-                await callback.message.edit_text(
-                    get_text(lang, "error_friendly"),
-                    reply_markup=_build_media_keyboard(lang),
-                    parse_mode="HTML",
-                )
-                _put_pending(user_id, callback.message.message_id, url)
+        await jobs.submit(
+            callback.bot, jobs.MEDIA_VIDEO, {"url": url, "lang": lang},
+            user_id, callback.message.chat.id, callback.message.message_id,
+        )
     except Exception as e:
         logger.error("md_v: %s", e)
         try:
             lang = await get_db().get_user_language(user_id)
             await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
-            _put_pending(user_id, callback.message.message_id, url)
+            await _put_pending(user_id, callback.message.message_id, url)
         except Exception:
             pass
 
 
 @router.callback_query(F.data == "md_mp3")
 async def on_media_mp3(callback: CallbackQuery) -> None:
-    url = _get_pending(callback)
+    url = await _get_pending(callback)
     if not url:
         await callback.answer(get_text("uz", "error_friendly"), show_alert=True)
         return
@@ -157,10 +161,13 @@ async def on_media_mp3(callback: CallbackQuery) -> None:
             path = await media_svc.download_as_mp3(url, prefix)
             if path and path.exists():
                 try:
-                    fname = sanitize_audio_filename("Track", "")
-                    audio_file = FSInputFile(path)
                     caption = get_text(lang, "mp3_caption", title="Track", artist="", album="", duration="")
-                    await callback.message.answer_audio(audio_file, caption=caption, parse_mode="HTML")
+                    await send_from_disk(
+                        path,
+                        lambda f: callback.message.answer_audio(f, caption=caption, parse_mode="HTML"),
+                        filename=sanitize_audio_filename("Track", "", path.suffix),
+                        platform=media_svc.detect_platform(url) or "Other",
+                    )
                     await callback.message.edit_text(
                         get_text(lang, "yt_done_keep"),
                         reply_markup=_build_media_keyboard(lang),
@@ -168,27 +175,28 @@ async def on_media_mp3(callback: CallbackQuery) -> None:
                     )
                 finally:
                     cleanup_temp_file(path)
-                _put_pending(user_id, callback.message.message_id, url)
+                await _put_pending(user_id, callback.message.message_id, url)
             else:
                 await callback.message.edit_text(
                     get_text(lang, "error_friendly"),
                     reply_markup=_build_media_keyboard(lang),
                     parse_mode="HTML",
                 )
-                _put_pending(user_id, callback.message.message_id, url)
+                await _put_pending(user_id, callback.message.message_id, url)
     except Exception as e:
         logger.error("md_mp3: %s", e)
         try:
             lang = await get_db().get_user_language(user_id)
-            await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
-            _put_pending(user_id, callback.message.message_id, url)
+            key = "file_too_big" if isinstance(e, FileTooLarge) else "error_friendly"
+            await callback.message.edit_text(get_text(lang, key), parse_mode="HTML")
+            await _put_pending(user_id, callback.message.message_id, url)
         except Exception:
             pass
 
 
 @router.callback_query(F.data == "md_s")
 async def on_media_shazam(callback: CallbackQuery) -> None:
-    url = _get_pending(callback)
+    url = await _get_pending(callback)
     if not url:
         await callback.answer(get_text("uz", "error_friendly"), show_alert=True)
         return
@@ -198,46 +206,65 @@ async def on_media_shazam(callback: CallbackQuery) -> None:
         db = get_db()
         lang = await db.get_user_language(user_id)
         await callback.message.edit_text("⏳", parse_mode="HTML")
-        async with queue_manager(user_id):
-            prefix = f"md_s_{user_id}_{callback.message.message_id}"
-            mp3_path = await media_svc.download_as_mp3(url, prefix)
-            if not mp3_path or not mp3_path.exists():
-                await callback.message.edit_text(
-                    get_text(lang, "error_friendly"),
-                    reply_markup=_build_media_keyboard(lang),
-                    parse_mode="HTML",
-                )
-                _put_pending(user_id, callback.message.message_id, url)
-                return
-            try:
-                track = await shazam_svc.recognize_file_thorough(mp3_path)
-            finally:
-                cleanup_temp_file(mp3_path)
-            if not track:
-                await callback.message.edit_text(
-                    get_text(lang, "not_found"),
-                    reply_markup=_build_media_keyboard(lang),
-                    parse_mode="HTML",
-                )
-                _put_pending(user_id, callback.message.message_id, url)
-                return
-            track_id = track.get("key") or track.get("title", "") or "unknown"
-            set_track(user_id, str(track_id), track)
-            title, artist, album, genre, year = _track_display_info(track)
-            text = get_text(
-                lang, "shazam_result",
-                title=title, artist=artist, album=album, genre=genre, year=year,
-            )
+        cache_key = recognition_cache.media_key(
+            media_svc.detect_platform(url) or "Other", media_svc.canonical_id(url)
+        )
+        hit, track = await recognition_cache.lookup(cache_key)
+        if not hit:
+            async with queue_manager(user_id):
+                # Avval faqat kerakli oynalarni o'qiymiz; oqim ochilmasa – to'liq yuklash
+                fetched = False
+                stream = await media_svc.probe_audio_stream(url)
+                if stream:
+                    track, fetched = await shazam_svc.recognize_stream(stream)
+                if not fetched:
+                    prefix = f"md_s_{user_id}_{callback.message.message_id}"
+                    mp3_path = await media_svc.download_as_mp3(url, prefix)
+                    if not mp3_path or not mp3_path.exists():
+                        await callback.message.edit_text(
+                            get_text(lang, "error_friendly"),
+                            reply_markup=_build_media_keyboard(lang),
+                            parse_mode="HTML",
+                        )
+                        await _put_pending(user_id, callback.message.message_id, url)
+                        return
+                    try:
+                        # Kalit – decode qilingan audio (fayl baytlari emas); PCM aniqlashda qayta ishlatiladi
+                        pcm = await shazam_svc.decode(mp3_path)
+                        hash_key = await recognition_cache.pcm_key(pcm.data) if pcm else None
+                        hit, track = await recognition_cache.lookup(hash_key)
+                        if not hit:
+                            track = await shazam_svc.recognize_file_thorough(mp3_path, audio=pcm)
+                            await recognition_cache.store(track, hash_key)
+                    finally:
+                        cleanup_temp_file(mp3_path)
+            await recognition_cache.store(track, cache_key)
+        if not track:
             await callback.message.edit_text(
-                text,
-                reply_markup=build_shazam_result_keyboard(str(track_id), lang),
+                get_text(lang, "not_found"),
+                reply_markup=_build_media_keyboard(lang),
                 parse_mode="HTML",
             )
+            await _put_pending(user_id, callback.message.message_id, url)
+            return
+        track_id = track.get("key") or track.get("title", "") or "unknown"
+        await set_track(user_id, str(track_id), track)
+        title, artist, album, genre, year = _track_display_info(track)
+        text = get_text(
+            lang, "shazam_result",
+            title=title, artist=artist, album=album, genre=genre, year=year,
+        )
+        await callback.message.edit_text(
+            text,
+            reply_markup=build_shazam_result_keyboard(str(track_id), lang),
+            parse_mode="HTML",
+        )
     except Exception as e:
         logger.error("md_s: %s", e)
         try:
             lang = await get_db().get_user_language(user_id)
-            await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
-            _put_pending(user_id, callback.message.message_id, url)
+            key = "file_too_big" if isinstance(e, FileTooLarge) else "error_friendly"
+            await callback.message.edit_text(get_text(lang, key), parse_mode="HTML")
+            await _put_pending(user_id, callback.message.message_id, url)
         except Exception:
             pass
@@ -3,7 +3,7 @@ import logging
 from pathlib import Path
 
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, BufferedInputFile
+from aiogram.types import Message, CallbackQuery
 
 from config import TEMP_DIR, MAX_FILE_SIZE_BYTES
 from database import get_db
@@ -13,7 +13,7 @@ from utils.locales import get_text
 from utils.queue_manager import queue_manager
 from utils.cleanup import cleanup_temp_file
 from utils.shazam_cache import get_track, set_track
-from utils.filename import sanitize_audio_filename
+from utils import jobs, recognition_cache
 
 router = Router(name="shazam")
 shazam_svc = ShazamService()
@@ -21,17 +21,14 @@ youtube_svc = YouTubeService()
 logger = logging.getLogger(__name__)
 
 
+def _telegram_media(message: Message):
+    """audio / video / video_note / voice – qaysi biri bo'lsa."""
+    return message.audio or message.video or message.video_note or message.voice
+
+
 async def _download_audio_from_telegram(message: Message) -> Path | None:
     """Download audio/video/voice/video_note to temp file. Returns path or None."""
-    file = None
-    if message.audio:
-        file = message.audio
-    elif message.video:
-        file = message.video
-    elif message.video_note:
-        file = message.video_note
-    elif message.voice:
-        file = message.voice
+    file = _telegram_media(message)
     if not file or file.file_size and file.file_size > MAX_FILE_SIZE_BYTES:
         return None
     bot = message.bot
@@ -68,20 +65,26 @@ async def on_audio_or_video(message: Message) -> None:
         db = get_db()
         lang = await db.get_user_language(user_id)
         status = await message.answer("⏳", parse_mode="HTML")
-        path = await _download_audio_from_telegram(message)
-        if not path:
-            await status.edit_text(get_text(lang, "file_too_big"), parse_mode="HTML")
-            return
-        try:
-            track = await shazam_svc.recognize_file_thorough(path)
-        finally:
-            cleanup_temp_file(path)
+        # Bir xil klip qayta forward qilinsa – yuklashsiz, cache dan
+        media = _telegram_media(message)
+        cache_key = recognition_cache.file_key(media.file_unique_id) if media else None
+        hit, track = await recognition_cache.lookup(cache_key)
+        if not hit:
+            path = await _download_audio_from_telegram(message)
+            if not path:
+                await status.edit_text(get_text(lang, "file_too_big"), parse_mode="HTML")
+                return
+            try:
+                track = await shazam_svc.recognize_file_thorough(path)
+            finally:
+                cleanup_temp_file(path)
+            await recognition_cache.store(track, cache_key)
         if not track:
             await status.edit_text(get_text(lang, "not_found"), parse_mode="HTML")
             return
         title, artist, album, genre, year = _track_display_info(track)
         track_id = track.get("key") or track.get("title", "") or "unknown"
-        set_track(user_id, str(track_id), track)
+        await set_track(user_id, str(track_id), track)
         text = get_text(
             lang,
             "shazam_result",
@@ -113,7 +116,7 @@ async def shazam_download_yt(callback: CallbackQuery) -> None:
     user_id = callback.from_user.id
     db = get_db()
     lang = await db.get_user_language(user_id)
-    track = get_track(user_id, track_id)
+    track = await get_track(user_id, track_id)
     if not track:
         await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
         return
@@ -122,28 +125,19 @@ async def shazam_download_yt(callback: CallbackQuery) -> None:
     query = f"{artist} {title}"
     await callback.message.edit_text("⏳", parse_mode="HTML")
     try:
-        async with queue_manager(user_id):
-            results = await youtube_svc.search(query, max_results=1)
-            if not results:
-                await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
-                return
-            vid = results[0].get("id") or results[0].get("video_id")
-            url = f"https://www.youtube.com/watch?v={vid}"
-            mp3_path, thumb_path = await youtube_svc.download_mp3_with_cover(
-                url, f"shazam_yt_{user_id}_{callback.message.message_id}", title, artist, ""
-            )
-            if mp3_path and mp3_path.exists():
-                try:
-                    fname = sanitize_audio_filename(title, artist)
-                    audio_file = BufferedInputFile(mp3_path.read_bytes(), filename=fname)
-                    caption = get_text(lang, "mp3_caption", title=title, artist=artist, album="", duration="")
-                    await callback.message.delete()
-                    await callback.message.answer_audio(audio_file, caption=caption, parse_mode="HTML")
-                finally:
-                    cleanup_temp_file(mp3_path)
-                    cleanup_temp_file(thumb_path)
-            else:
-                await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
+        results = await youtube_svc.search(query, max_results=1)
+        if not results:
+            await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
+            return
+        vid = results[0].get("id") or results[0].get("video_id")
+        await jobs.submit(
+            callback.bot, jobs.YT_TRACK,
+            {
+                "vid": vid, "lang": lang, "title": title, "artist": artist,
+                "prefix": f"shazam_yt_{user_id}_{callback.message.message_id}",
+            },
+            user_id, callback.message.chat.id, callback.message.message_id,
+        )
     except Exception as e:
         logger.error("shazam_yt: %s", e)
         await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
@@ -156,7 +150,7 @@ async def shazam_ten_variants(callback: CallbackQuery) -> None:
     user_id = callback.from_user.id
     db = get_db()
     lang = await db.get_user_language(user_id)
-    track = get_track(user_id, track_id)
+    track = await get_track(user_id, track_id)
     if not track:
         await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
         return
@@ -1,20 +1,41 @@
 """10 variants: user chose one → download that YouTube as MP3."""
 import logging
-from aiogram import Router, F
-from aiogram.types import CallbackQuery, BufferedInputFile
+from aiogram import Bot, Router, F
+from aiogram.types import CallbackQuery
 
 from database import get_db
-from services import YouTubeService
+from services import FileTooLarge
+from utils import jobs
 from utils.locales import get_text
-from utils.queue_manager import queue_manager
-from utils.cleanup import cleanup_temp_file
-from utils.filename import sanitize_audio_filename
+from utils.delivery import deliver_youtube_mp3
 
 router = Router(name="variants")
-youtube_svc = YouTubeService()
 logger = logging.getLogger(__name__)
 
 
+@jobs.runner(jobs.YT_TRACK)
+async def run_track_job(bot: Bot, job: jobs.Job) -> None:
+    """YouTube MP3 (variant yoki Shazam natijasi): yuborilgach status xabari o'chiriladi."""
+    p = job.payload
+    try:
+        sent = await deliver_youtube_mp3(
+            bot, job.chat_id, job.user_id, p["vid"], job.lang, p["prefix"],
+            title=p.get("title", ""), artist=p.get("artist", ""),
+        )
+        key = "error_friendly"
+    except FileTooLarge:
+        sent, key = None, "file_too_big"
+    if sent:
+        await jobs.after_send(job, bot.delete_message(job.chat_id, job.status_message_id))
+    else:
+        await jobs.after_send(job, bot.edit_message_text(
+            get_text(job.lang, key),
+            chat_id=job.chat_id,
+            message_id=job.status_message_id,
+            parse_mode="HTML",
+        ))
+
+
 @router.callback_query(F.data.startswith("var:"))
 async def on_variant_chosen(callback: CallbackQuery) -> None:
     video_id = callback.data.split("var:", 1)[1]
@@ -24,31 +45,11 @@ async def on_variant_chosen(callback: CallbackQuery) -> None:
         db = get_db()
         lang = await db.get_user_language(user_id)
         await callback.message.edit_text("⏳", parse_mode="HTML")
-        async with queue_manager(user_id):
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            prefix = f"var_{user_id}_{callback.message.message_id}_{video_id}"
-            mp3_path, thumb_path = await youtube_svc.download_mp3_with_cover(
-                url, prefix, "", "", ""
-            )
-            if mp3_path and mp3_path.exists():
-                try:
-                    info = await youtube_svc.get_video_info(video_id)
-                    title = (info.get("title") or "Track")[:50]
-                    duration = info.get("duration")
-                    duration_str = f"{duration // 60}:{duration % 60:02d}" if duration else "—"
-                    caption = get_text(
-                        lang, "mp3_caption",
-                        title=title, artist="", album="", duration=duration_str,
-                    )
-                    fname = sanitize_audio_filename(title, "")
-                    audio_file = BufferedInputFile(mp3_path.read_bytes(), filename=fname)
-                    await callback.message.delete()
-                    await callback.message.answer_audio(audio_file, caption=caption, parse_mode="HTML")
-                finally:
-                    cleanup_temp_file(mp3_path)
-                    cleanup_temp_file(thumb_path)
-            else:
-                await callback.message.edit_text(get_text(lang, "error_friendly"), parse_mode="HTML")
+        prefix = f"var_{user_id}_{callback.message.message_id}_{video_id}"
+        await jobs.submit(
+            callback.bot, jobs.YT_TRACK, {"vid": video_id, "lang": lang, "prefix": prefix},
+            user_id, callback.message.chat.id, callback.message.message_id,
+        )
     except Exception as e:
         logger.error("variants: %s", e)
         try:
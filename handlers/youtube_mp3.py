@@ -1,20 +1,21 @@
 """YouTube link → 3 ta tanlash: MP3, Video, Qo'shiqni to'liq topish. Inline tugmalar qoladi."""
 import logging
 from pathlib import Path
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, BufferedInputFile, FSInputFile
+from aiogram import Bot, Router, F
+from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardButton
 
 from database import get_db
-from services import YouTubeService, ShazamService
+from services import YouTubeService, ShazamService, FileTooLarge
 from keyboards.inline import build_shazam_result_keyboard
 from utils.locales import get_text
 from utils.queue_manager import queue_manager
 from utils.cleanup import cleanup_temp_file
 from utils.url_extract import get_youtube_id_from_message
 from utils.shazam_cache import set_track
-from utils.filename import sanitize_audio_filename
+from utils import jobs, recognition_cache
+from utils.delivery import deliver_youtube_mp3, deliver_video
 
 router = Router(name="youtube_mp3")
 youtube_svc = YouTubeService()
@@ -76,6 +77,46 @@ async def on_youtube_link(message: Message) -> None:
             pass
 
 
+@jobs.runner(jobs.YT_MP3)
+async def run_mp3_job(bot: Bot, job: jobs.Job) -> None:
+    vid, lang = job.payload["vid"], job.lang
+    prefix = f"yt_mp3_{job.user_id}_{job.status_message_id}"
+    try:
+        sent = await deliver_youtube_mp3(bot, job.chat_id, job.user_id, vid, lang, prefix)
+        key = "yt_done_keep" if sent else "error_friendly"
+    except FileTooLarge:
+        key = "file_too_big"
+    await jobs.after_send(job, bot.edit_message_text(
+        get_text(lang, key),
+        chat_id=job.chat_id,
+        message_id=job.status_message_id,
+        reply_markup=_build_yt_choice_keyboard(vid, lang),
+        parse_mode="HTML",
+    ))
+
+
+@jobs.runner(jobs.YT_VIDEO)
+async def run_video_job(bot: Bot, job: jobs.Job) -> None:
+    vid, lang = job.payload["vid"], job.lang
+    url = f"https://www.youtube.com/watch?v={vid}"
+    prefix = f"yt_vid_{job.user_id}_{job.status_message_id}"
+    try:
+        sent = await deliver_video(
+            bot, job.chat_id, job.user_id, "YouTube", vid,
+            lambda: youtube_svc.download_video(url, prefix),
+        )
+        key = "yt_done_keep" if sent else "error_friendly"
+    except FileTooLarge:
+        key = "file_too_big"
+    await jobs.after_send(job, bot.edit_message_text(
+        get_text(lang, key),
+        chat_id=job.chat_id,
+        message_id=job.status_message_id,
+        reply_markup=_build_yt_choice_keyboard(vid, lang),
+        parse_mode="HTML",
+    ))
+
+
 @router.callback_query(F.data.startswith("yt_mp3:"))
 async def do_mp3(callback: CallbackQuery) -> None:
     vid = callback.data.split("yt_mp3:", 1)[1]
@@ -85,39 +126,10 @@ async def do_mp3(callback: CallbackQuery) -> None:
         db = get_db()
         lang = await db.get_user_language(user_id)
         await callback.message.edit_text("⏳", parse_mode="HTML")
-        url = f"https://www.youtube.com/watch?v={vid}"
-        async with queue_manager(user_id):
-            prefix = f"yt_mp3_{user_id}_{callback.message.message_id}"
-            mp3_path, thumb_path = await youtube_svc.download_mp3_with_cover(
-                url, prefix, "", "", ""
-            )
-            if mp3_path and mp3_path.exists():
-                try:
-                    info = await youtube_svc.get_video_info(vid)
-                    title = (info.get("title") or "Track")[:50]
-                    duration = info.get("duration")
-                    duration_str = f"{duration // 60}:{duration % 60:02d}" if duration else "—"
-                    caption = get_text(
-                        lang, "mp3_caption",
-                        title=title, artist="", album="", duration=duration_str,
-                    )
-                    fname = sanitize_audio_filename(title, "")
-                    audio_file = BufferedInputFile(mp3_path.read_bytes(), filename=fname)
-                    await callback.message.answer_audio(audio_file, caption=caption, parse_mode="HTML")
-                    await callback.message.edit_text(
-                        get_text(lang, "yt_done_keep"),
-                        reply_markup=_build_yt_choice_keyboard(vid, lang),
-                        parse_mode="HTML",
-                    )
-                finally:
-                    cleanup_temp_file(mp3_path)
-                    cleanup_temp_file(thumb_path)
-            else:
-                await callback.message.edit_text(
-                    get_text(lang, "error_friendly"),
-                    reply_markup=_build_yt_choice_keyboard(vid, lang),
-                    parse_mode="HTML",
-                )
+        await jobs.submit(
+            callback.bot, jobs.YT_MP3, {"vid": vid, "lang": lang},
+            user_id, callback.message.chat.id, callback.message.message_id,
+        )
     except Exception as e:
         logger.error("yt_mp3: %s", e)
         try:
@@ -141,26 +153,10 @@ async def do_video(callback: CallbackQuery) -> None:
         db = get_db()
         lang = await db.get_user_language(user_id)
         await callback.message.edit_text("⏳", parse_mode="HTML")
-        url = f"https://www.youtube.com/watch?v={vid}"
-        async with queue_manager(user_id):
-            prefix = f"yt_vid_{user_id}_{callback.message.message_id}"
-            path = await youtube_svc.download_video(url, prefix)
-            if path and path.exists():
-                try:
-                    await callback.message.answer_video(FSInputFile(path))
-                    await callback.message.edit_text(
-                        get_text(lang, "yt_done_keep"),
-                        reply_markup=_build_yt_choice_keyboard(vid, lang),
-                        parse_mode="HTML",
-                    )
-                finally:
-                    cleanup_temp_file(path)
-            else:
-                await callback.message.edit_text(
-                    get_text(lang, "error_friendly"),
-                    reply_markup=_build_yt_choice_keyboard(vid, lang),
-                    parse_mode="HTML",
-                )
+        await jobs.submit(
+            callback.bot, jobs.YT_VIDEO, {"vid": vid, "lang": lang},
+            user_id, callback.message.chat.id, callback.message.message_id,
+        )
     except Exception as e:
         logger.error("yt_vid: %s", e)
         try:
@@ -186,47 +182,62 @@ async def do_yt_shazam(callback: CallbackQuery) -> None:
         lang = await db.get_user_language(user_id)
         await callback.message.edit_text("⏳", parse_mode="HTML")
         url = f"https://www.youtube.com/watch?v={vid}"
-        async with queue_manager(user_id):
-            prefix = f"yt_shazam_{user_id}_{callback.message.message_id}"
-            mp3_path, thumb_path = await youtube_svc.download_mp3_with_cover(url, prefix, "", "", "")
-            if not mp3_path or not mp3_path.exists():
-                await callback.message.edit_text(
-                    get_text(lang, "error_friendly"),
-                    reply_markup=_build_yt_choice_keyboard(vid, lang),
-                    parse_mode="HTML",
-                )
-                return
-            try:
-                track = await shazam_svc.recognize_file_thorough(mp3_path)
-            finally:
-                cleanup_temp_file(mp3_path)
-                cleanup_temp_file(thumb_path)
-            if not track:
-                await callback.message.edit_text(
-                    get_text(lang, "not_found"),
-                    reply_markup=_build_yt_choice_keyboard(vid, lang),
-                    parse_mode="HTML",
-                )
-                return
-            track_id = track.get("key") or track.get("title", "") or "unknown"
-            set_track(user_id, str(track_id), track)
-            title, artist, album, genre, year = _track_display_info(track)
-            text = get_text(
-                lang, "shazam_result",
-                title=title, artist=artist, album=album, genre=genre, year=year,
-            )
+        cache_key = recognition_cache.media_key("YouTube", vid)
+        hit, track = await recognition_cache.lookup(cache_key)
+        if not hit:
+            async with queue_manager(user_id):
+                # Avval faqat kerakli oynalarni o'qiymiz; oqim ochilmasa – to'liq yuklash
+                fetched = False
+                stream = await youtube_svc.probe_audio_stream(url)
+                if stream:
+                    track, fetched = await shazam_svc.recognize_stream(stream)
+                if not fetched:
+                    prefix = f"yt_shazam_{user_id}_{callback.message.message_id}"
+                    audio = await youtube_svc.download_mp3_with_cover(url, prefix, "", "", "")
+                    if not audio or not audio.path.exists():
+                        await callback.message.edit_text(
+                            get_text(lang, "error_friendly"),
+                            reply_markup=_build_yt_choice_keyboard(vid, lang),
+                            parse_mode="HTML",
+                        )
+                        return
+                    try:
+                        # Kalit – decode qilingan audio (fayl baytlari emas); PCM aniqlashda qayta ishlatiladi
+                        pcm = await shazam_svc.decode(audio.path)
+                        hash_key = await recognition_cache.pcm_key(pcm.data) if pcm else None
+                        hit, track = await recognition_cache.lookup(hash_key)
+                        if not hit:
+                            track = await shazam_svc.recognize_file_thorough(audio.path, audio=pcm)
+                            await recognition_cache.store(track, hash_key)
+                    finally:
+                        cleanup_temp_file(audio.path)
+            await recognition_cache.store(track, cache_key)
+        if not track:
             await callback.message.edit_text(
-                text,
-                reply_markup=build_shazam_result_keyboard(str(track_id), lang),
+                get_text(lang, "not_found"),
+                reply_markup=_build_yt_choice_keyboard(vid, lang),
                 parse_mode="HTML",
             )
+            return
+        track_id = track.get("key") or track.get("title", "") or "unknown"
+        await set_track(user_id, str(track_id), track)
+        title, artist, album, genre, year = _track_display_info(track)
+        text = get_text(
+            lang, "shazam_result",
+            title=title, artist=artist, album=album, genre=genre, year=year,
+        )
+        await callback.message.edit_text(
+            text,
+            reply_markup=build_shazam_result_keyboard(str(track_id), lang),
+            parse_mode="HTML",
+        )
     except Exception as e:
         logger.error("yt_shazam: %s", e)
         try:
             db = get_db()
             lang = await db.get_user_language(user_id)
             await callback.message.edit_text(
-                get_text(lang, "error_friendly"),
+                get_text(lang, "file_too_big" if isinstance(e, FileTooLarge) else "error_friendly"),
                 reply_markup=_build_yt_choice_keyboard(vid, lang),
                 parse_mode="HTML",
             )
@@ -19,7 +19,18 @@ from aiogram.client.default import DefaultBotProperties
 from aiohttp import web
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import BOT_TOKEN, ADMIN_ID, FFMPEG_LOCATION, FFPROBE_LOCATION, PORT, WEBHOOK_URL, WEBHOOK_PATH
+from config import (
+    BOT_TOKEN,
+    ADMIN_ID,
+    FFMPEG_LOCATION,
+    FFPROBE_LOCATION,
+    PORT,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    JOB_RETENTION_SEC,
+    DB_PURGE_INTERVAL_SEC,
+    METRICS_PORT,
+)
 
 # Pydub uchun ffmpeg va ffprobe yo'llari (ogohlantirishlar chiqmasin)
 if FFMPEG_LOCATION and os.path.isfile(FFMPEG_LOCATION):
@@ -49,6 +60,9 @@ from handlers import (
     admin_router,
 )
 from middlewares.subscription import SubscriptionMiddleware
+from middlewares.rate_limit import RateLimitMiddleware
+from middlewares.metrics import MetricsMiddleware
+from utils import executors, metrics
 
 # Faqat xatoliklar; user_id, chat_id, token terminalda chiqmasin
 logging.basicConfig(
@@ -66,16 +80,39 @@ def _check_ffmpeg() -> bool:
     return shutil.which("ffmpeg") is not None
 
 
+_purge_task: asyncio.Task | None = None
+
+
+async def _purge_expired() -> None:
+    """kv_cache (qidiruv cache, holat) va tugagan vazifalar ishlash davomida ham o'sib ketmasin."""
+    db = get_db()
+    while True:
+        try:
+            await db.kv_purge_expired()
+            await db.purge_jobs(JOB_RETENTION_SEC)
+        except Exception as e:
+            logger.error("db purge: %s", e)
+        await asyncio.sleep(DB_PURGE_INTERVAL_SEC)
+
+
 async def on_startup(bot: Bot) -> None:
+    global _purge_task
     db = get_db()
     await db.connect()
+    if _purge_task is None:
+        _purge_task = asyncio.create_task(_purge_expired())
     if not _check_ffmpeg():
         logger.error("FFmpeg topilmadi.")
 
 
 async def on_shutdown(bot: Bot) -> None:
+    global _purge_task
+    if _purge_task is not None:
+        _purge_task.cancel()
+        _purge_task = None
     db = get_db()
     await db.close()
+    executors.shutdown()
 
 
 def main() -> None:
@@ -88,8 +125,12 @@ def main() -> None:
     dp = Dispatcher()
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
     dp.message.middleware(SubscriptionMiddleware())
     dp.callback_query.middleware(SubscriptionMiddleware())
+    dp.message.middleware(RateLimitMiddleware())
+    dp.callback_query.middleware(RateLimitMiddleware())
     
     dp.include_router(admin_router)
     dp.include_router(search_router)
@@ -127,12 +168,22 @@ def main() -> None:
         
         app.router.add_get("/", health_check)
         app.router.add_get("/health", health_check)
+        app.router.add_get("/metrics", metrics.handle_metrics)
 
         web.run_app(app, host="0.0.0.0", port=PORT if PORT > 0 else 8080)
     else:
-        # Polling mode (Local)
+        # Polling mode (Local); /metrics – alohida kichik serverda
+        async def run_polling() -> None:
+            port = METRICS_PORT or PORT
+            runner = await metrics.start_server(port) if port > 0 else None
+            try:
+                await dp.start_polling(bot)
+            finally:
+                if runner:
+                    await runner.cleanup()
+
         try:
-            asyncio.run(dp.start_polling(bot))
+            asyncio.run(run_polling())
         except KeyboardInterrupt:
             pass
 
@@ -1,3 +1,5 @@
 from .subscription import SubscriptionMiddleware
+from .rate_limit import RateLimitMiddleware
+from .metrics import MetricsMiddleware
 
-__all__ = ["SubscriptionMiddleware"]
+__all__ = ["SubscriptionMiddleware", "RateLimitMiddleware", "MetricsMiddleware"]
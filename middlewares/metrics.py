@@ -0,0 +1,26 @@
+"""Har bir handler uchun update soni va davomiyligi (utils/metrics.py, /metrics) hamda bosqichlar trace (utils/tracing.py)."""
+import time
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils import metrics, tracing
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Inner middleware sifatida birinchi ulanadi: obuna/rate limit rad etgan update lar ham sanaladi."""
+
+    async def __call__(self, handler, event: TelegramObject, data: dict):
+        handler_obj = data.get("handler")
+        name = getattr(getattr(handler_obj, "callback", None), "__name__", "unknown")
+        event_type = type(event).__name__.lower()
+        started = time.monotonic()
+        status = "error"
+        user = getattr(event, "from_user", None)
+        try:
+            with tracing.trace(name, user_id=user.id if user else None):
+                result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            metrics.updates.inc(handler=name, event=event_type, status=status)
+            metrics.handler_seconds.observe(time.monotonic() - started, handler=name)
@@ -0,0 +1,53 @@
+"""So'rovlar tezligi: og'ir ishga olib keladigan xabar/callbacklar token bucket dan o'tadi, spam yt-dlp gacha yetmaydi."""
+import logging
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery, TelegramObject
+
+from database import get_db
+from utils.locales import get_text
+from utils.rate_limit import limiter
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Yuklash / aniqlash / qidiruvni boshlaydigan tugmalar
+COSTLY_CALLBACKS = ("yt_mp3:", "yt_vid:", "yt_shazam:", "md_v", "md_mp3", "md_s", "shazam_yt:", "shazam_var:", "var:")
+
+# Rad etilgan userga ogohlantirish bir marta yuboriladi (spamga spam bilan javob bermaslik uchun)
+_warned = TTLCache(10000, 60)
+
+
+def _is_costly(event: TelegramObject) -> bool:
+    if isinstance(event, CallbackQuery):
+        return bool(event.data) and event.data.startswith(COSTLY_CALLBACKS)
+    if isinstance(event, Message):
+        # Buyruqlar (/start, /admin) arzon; link, qidiruv matni, audio/video – og'ir
+        return not (event.text or "").startswith("/")
+    return False
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """Har bir og'ir so'rovdan oldin user va global token bucket. Token yo'q – qisqa kutish, spam – rad etish."""
+
+    async def __call__(self, handler, event: TelegramObject, data: dict):
+        user = getattr(event, "from_user", None)
+        if not user or not _is_costly(event):
+            return await handler(event, data)
+        if await limiter.admit(user.id):
+            _warned.pop(user.id)
+            return await handler(event, data)
+        if user.id in _warned:
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return None
+        _warned.set(user.id, True)
+        try:
+            lang = await get_db().get_user_language(user.id)
+            text = get_text(lang, "rate_limited")
+            if isinstance(event, CallbackQuery):
+                await event.answer(text, show_alert=True)
+            else:
+                await event.answer(text, parse_mode="HTML")
+        except Exception as e:
+            logger.error("rate_limit notify: %s", e)
+        return None
@@ -1,5 +1,5 @@
 from .shazam_service import ShazamService
-from .youtube_service import YouTubeService
-from .media_downloader import MediaDownloaderService
+from .youtube_service import YouTubeService, AudioDownload
+from .media_downloader import MediaDownloaderService, FileTooLarge
 
-__all__ = ["ShazamService", "YouTubeService", "MediaDownloaderService"]
+__all__ = ["ShazamService", "YouTubeService", "AudioDownload", "MediaDownloaderService", "FileTooLarge"]
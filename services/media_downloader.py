@@ -1,10 +1,16 @@
 """Media download from Instagram, TikTok, Pinterest, Facebook, YouTube (video)."""
-import asyncio
 import re
+import time
 from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
 import yt_dlp
+from yt_dlp.utils import DownloadCancelled, DownloadError
 
-from config import TEMP_DIR, MAX_FILE_SIZE_BYTES, FFMPEG_LOCATION
+from config import TEMP_DIR, MAX_FILE_SIZE_BYTES, FFMPEG_LOCATION, AUDIO_OUTPUT
+from utils.cleanup import cleanup_prefix
+from utils.executors import metadata_pool, download_pool, report_latency
+from utils import platform_limits, tracing
+from utils.platform_limits import CircuitOpen
 
 # URL patterns
 YT_PATTERN = re.compile(
@@ -22,6 +28,164 @@ PINTEREST_PATTERN = re.compile(
 FACEBOOK_PATTERN = re.compile(
     r"(?:https?://)?(?:www\.|m\.)?(?:facebook\.com|fb\.watch|fb\.com|fb.watch)/[^\s]+"
 )
+# Media ni aniqlamaydigan (kuzatuv/ulashish) query parametrlari – canonical_id da tashlanadi
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "igshid", "igsh", "mibextid", "si", "feature", "ref", "rdid", "share_url", "_rdr",
+    "_r", "_t", "is_from_webapp", "sender_device", "is_copy_url", "web_id",
+}
+TRACKING_PREFIXES = ("utm_", "__")
+
+
+# size_capped_format qo'shgan hajm filtrlari: limitni olish va asl tanlovni tiklash uchun
+SIZE_LIMIT_RE = re.compile(r"\[filesize<=(\d+)\]")
+SIZE_FILTER_RE = re.compile(r"\[filesize(?:_approx)?<\??=?\d+\]")
+
+# Shazam uchun: eng kichik audio oqim (faqat kerakli oynalar o'qiladi)
+PROBE_AUDIO_FORMAT = "worstaudio/bestaudio/worst"
+
+
+def audio_stream_info(info: dict | None) -> dict | None:
+    """extract_info (download=False) natijasidan audio oqim: {url, http_headers, duration, title, uploader, thumbnail}."""
+    if not info:
+        return None
+    chosen = info
+    if not chosen.get("url"):
+        # Alohida video+audio tanlangan bo'lsa – audio qismini olamiz
+        chosen = next(
+            (f for f in info.get("requested_formats") or [] if f.get("acodec") not in (None, "none")),
+            None,
+        )
+    if not chosen or not chosen.get("url"):
+        return None
+    return {
+        "url": chosen["url"],
+        "http_headers": chosen.get("http_headers") or info.get("http_headers") or {},
+        "duration": info.get("duration"),
+        "title": info.get("title") or "",
+        "uploader": info.get("uploader") or info.get("channel") or "",
+        "thumbnail": info.get("thumbnail"),
+    }
+
+
+class FileTooLarge(DownloadCancelled):
+    """Fayl MAX_FILE_SIZE_BYTES dan katta: yuklash to'xtatildi yoki limitga mos format yo'q."""
+
+    # Platforma javob berdi – circuit breaker uchun xato emas
+    platform_ok = True
+
+
+def size_guard_hook(limit: int = MAX_FILE_SIZE_BYTES):
+    """
+    yt-dlp progress hook: yuklangan baytlar (video+audio qismlari yig'indisi) limitdan oshishi bilan
+    yoki aniq total_bytes limitdan katta bo'lsa – FileTooLarge, transfer darhol to'xtaydi.
+    """
+    downloaded: dict[str, int] = {}
+
+    def hook(d: dict) -> None:
+        if d.get("status") != "downloading":
+            return
+        name = d.get("tmpfilename") or d.get("filename") or ""
+        downloaded[name] = d.get("downloaded_bytes") or 0
+        total = d.get("total_bytes")
+        if sum(downloaded.values()) > limit or (total and total > limit):
+            raise FileTooLarge(f"download exceeds {limit} bytes")
+
+    return hook
+
+
+def with_size_guard(opts: dict, limit: int = MAX_FILE_SIZE_BYTES) -> dict:
+    opts["progress_hooks"] = [*opts.get("progress_hooks", []), size_guard_hook(limit)]
+    return opts
+
+
+def run_ydl(opts: dict, url: str, download: bool = True):
+    """
+    extract_info. size_capped_format bilan hech bir format mos kelmasa (hammasi katta) – FileTooLarge.
+    download=True – birinchi baytgacha vaqt executor observer lariga (adaptiv limit) beriladi.
+    """
+    first_byte: list[float] = []
+    if download:
+        def hook(d: dict) -> None:
+            if not first_byte and d.get("status") == "downloading":
+                first_byte.append(time.monotonic())
+
+        opts = {**opts, "progress_hooks": [*opts.get("progress_hooks", []), hook]}
+    started = time.monotonic()
+    try:
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            try:
+                return ydl.extract_info(url, download=download)
+            except DownloadError as e:
+                fmt = str(opts.get("format", ""))
+                if "Requested format is not available" in str(e) and _all_formats_too_large(ydl, url, fmt):
+                    raise FileTooLarge("no format fits the size limit") from e
+                raise
+    finally:
+        if first_byte:
+            report_latency(first_byte[0] - started)
+
+
+def _all_formats_too_large(ydl, url: str, fmt: str) -> bool:
+    """
+    size_capped_format tanlovi bo'sh chiqdi – sabab haqiqatan hajmmi? Formatlar ro'yxati qayta olinadi:
+    asl (filtrsiz) tanlovga kamida bitta format mos kelishi va har birining hajmi ma'lum hamda limitdan katta
+    bo'lishi kerak. Aks holda (mos format yo'q, hajm noma'lum, extract xatosi) – bu format/platforma xatosi.
+    """
+    m = SIZE_LIMIT_RE.search(fmt)
+    if not m:
+        return False
+    limit = int(m.group(1))
+    base = [SIZE_FILTER_RE.sub("", a) for a in fmt.split("/") if "+" not in a]
+    try:
+        info = ydl.extract_info(url, download=False, process=False)
+        formats = info.get("formats") or []
+        selectors = [ydl.build_format_selector(a) for a in dict.fromkeys(base)]
+    except Exception:
+        return False
+
+    def matches(f: dict) -> bool:
+        ctx = {"formats": [f], "has_merged_format": False, "incomplete_formats": False}
+        return any(list(select(ctx)) for select in selectors)
+
+    matched = [f for f in formats if matches(f)]
+    return bool(matched) and all((f.get("filesize") or f.get("filesize_approx") or 0) > limit for f in matched)
+
+
+def size_capped_format(selector: str, limit: int = MAX_FILE_SIZE_BYTES) -> str:
+    """
+    yt-dlp format selector ni hajm bo'yicha cheklash (yuklashdan oldin, extract paytida tanlanadi):
+    1) aniq hajmi (filesize) limitdan kichik eng yaxshi format – kerak bo'lsa pastroq sifat;
+    2) taxminiy hajmi (filesize_approx) bo'yicha;
+    3) hajmi umuman noma'lum bo'lsa – asl tanlov.
+    Hajmi ma'lum va hammasi katta bo'lsa hech narsa tanlanmaydi – yt-dlp yuklamasdan xato beradi.
+    video+audio birlashmalari ("+") filtrlanmaydi va oxirida qoladi.
+    """
+    alternatives = [a for a in selector.split("/") if a]
+    single = [a for a in alternatives if "+" not in a]
+    merged = [a for a in alternatives if "+" in a]
+    parts = [f"{a}[filesize<={limit}]" for a in single]
+    parts += [f"{a}[filesize_approx<={limit}]" for a in single]
+    parts += [f"{a}[filesize<?{limit}][filesize_approx<?{limit}]" for a in single]
+    return "/".join(parts + merged)
+
+
+# Audio siyosati: (format selector, FFmpegExtractAudio preferredcodec).
+# m4a: AAC manba bo'lsa yt-dlp "-acodec copy" qiladi – qayta kodlash yo'q; Opus va h.k. AAC ga o'giriladi.
+# Telegram send_audio faqat MP3 va M4A ni pleyerda ko'rsatadi, shuning uchun Opus nusxalanmaydi.
+AUDIO_POLICIES = {
+    "mp3": ("bestaudio/best", "mp3"),
+    "native": ("bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best", "m4a"),
+}
+
+
+def audio_output(policy: str = AUDIO_OUTPUT) -> tuple[dict, str]:
+    """Siyosat bo'yicha yt-dlp opts qismi (format + postprocessor) va natija kengaytmasi."""
+    fmt, codec = AUDIO_POLICIES.get(policy, AUDIO_POLICIES["mp3"])
+    opts = {
+        "format": fmt,
+        "postprocessors": [{"key": "FFmpegExtractAudio", "preferredcodec": codec, "preferredquality": "192"}],
+    }
+    return opts, codec
 
 
 def _ydl_opts(prefix: str, format_best: bool = False, audio_only: bool = False, platform: str | None = None) -> dict:
@@ -30,16 +194,13 @@ def _ydl_opts(prefix: str, format_best: bool = False, audio_only: bool = False,
         "quiet": True,
         "no_warnings": True,
         "outtmpl": str(out),
-        "format": "best" if format_best else "best[ext=mp4]/best/bestvideo+bestaudio",
+        "format": size_capped_format("best" if format_best else "best[ext=mp4]/best/bestvideo+bestaudio"),
         "socket_timeout": 45,
         "retries": 5,
         "fragment_retries": 3,
     }
     if audio_only:
-        opts["format"] = "bestaudio/best"
-        opts["postprocessors"] = [
-            {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "192"}
-        ]
+        opts.update(audio_output()[0])
         opts["postprocessor_args"] = {"ffmpeg": ["-y"]}
     if FFMPEG_LOCATION:
         opts["ffmpeg_location"] = FFMPEG_LOCATION
@@ -50,7 +211,7 @@ def _ydl_opts(prefix: str, format_best: bool = False, audio_only: bool = False,
         opts.setdefault("extractor_args", {})["tiktok"] = {"format": "best"}
     elif platform == "Facebook":
         opts.setdefault("extractor_args", {})["facebook"] = {"format": "best"}
-    return opts
+    return with_size_guard(opts)
 
 
 class MediaDownloaderService:
@@ -68,30 +229,79 @@ class MediaDownloaderService:
             return "Facebook"
         return None
 
-    def _run_ydl(self, opts: dict, url: str):
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            return ydl.extract_info(url, download=True)
+    @staticmethod
+    def canonical_id(url: str) -> str:
+        """
+        Bir xil media uchun barqaror kalit: YouTube id, Instagram shortcode, aks holda host + yo'l + aniqlovchi
+        query (v, story_fbid, id, ...). Faqat kuzatuv parametrlari tashlanadi – watch?v=1 va watch?v=2 farqli kalit.
+        """
+        m = YT_PATTERN.search(url)
+        if m:
+            return m.group(1)
+        m = INSTA_PATTERN.search(url)
+        if m:
+            return m.group(1)
+        parts = urlsplit(url if "://" in url else f"https://{url}")
+        host = parts.netloc.lower().removeprefix("www.").removeprefix("m.")
+        query = sorted(
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+        )
+        key = f"{host}{parts.path.rstrip('/')}"
+        return f"{key}?{urlencode(query)}" if query else key
+
+    def _run_ydl(self, opts: dict, url: str, download: bool = True):
+        return run_ydl(opts, url, download=download)
+
+    async def probe_audio_stream(self, url: str, fmt: str = PROBE_AUDIO_FORMAT) -> dict | None:
+        """
+        Yuklamasdan audio oqimini topish. Default – eng kichigi (Shazam uchun qisman o'qish);
+        fmt="bestaudio..." – to'g'ridan-to'g'ri transcode/stream uchun.
+        Returns {url, http_headers, duration, title, uploader, thumbnail} yoki None.
+        YouTube uchun YouTubeService.probe_audio_stream (cookie + User-Agent) ishlatiladi.
+        """
+        platform = self.detect_platform(url)
+        opts = _ydl_opts("probe", platform=platform)
+        opts["format"] = fmt
+        opts["noplaylist"] = True
+        try:
+            # Probe ixtiyoriy: xato bo'lsa yuklashga o'tiladi – breaker ga yozilmaydi
+            async with platform_limits.guard(platform, limited=False, count=False):
+                with tracing.span("probe", platform=platform or "Other"):
+                    info = await metadata_pool.run(lambda: self._run_ydl(opts, url, download=False))
+        except Exception:
+            return None
+        return audio_stream_info(info)
 
     async def _download_generic(self, url: str, prefix: str, retries: int = 2) -> Path | None:
-        """Video yuklash: Instagram/TikTok/Facebook/Pinterest – to'liq va aniq."""
+        """
+        Video yuklash: Instagram/TikTok/Facebook/Pinterest – to'liq va aniq.
+        Fayl limitdan katta bo'lsa FileTooLarge (qisman fayllar o'chiriladi, qayta urinilmaydi).
+        """
         platform = self.detect_platform(url)
-        loop = asyncio.get_event_loop()
         for attempt in range(max(1, retries)):
             try:
                 opts = _ydl_opts(prefix, format_best=True, platform=platform)
-                info = await loop.run_in_executor(
-                    None, lambda u=url, o=opts: self._run_ydl(o, u)
-                )
+                async with platform_limits.guard(platform):
+                    with tracing.span("download", platform=platform or "Other", kind="video", attempt=attempt) as s:
+                        tracing.watch_ydl(opts, s)
+                        info = await download_pool.run(lambda u=url, o=opts: self._run_ydl(o, u))
                 if not info:
                     continue
                 requested = info.get("requested_downloads") or []
-                for d in requested:
-                    p = Path(d.get("filepath", d.get("filename", "")))
-                    if p.exists() and p.stat().st_size <= MAX_FILE_SIZE_BYTES:
+                candidates = [Path(d.get("filepath", d.get("filename", ""))) for d in requested]
+                candidates += [f for f in TEMP_DIR.iterdir() if f.is_file() and f.name.startswith(prefix)]
+                for p in candidates:
+                    if p.is_file() and p.stat().st_size <= MAX_FILE_SIZE_BYTES:
                         return p
-                for f in TEMP_DIR.iterdir():
-                    if f.is_file() and f.name.startswith(prefix) and f.stat().st_size <= MAX_FILE_SIZE_BYTES:
-                        return f
+                if any(p.is_file() for p in candidates):
+                    raise FileTooLarge("downloaded file exceeds size limit")
+            except FileTooLarge:
+                cleanup_prefix(prefix)
+                raise
+            except CircuitOpen:
+                # Platforma hozir ishlamayapti – qayta urinish ma'nosiz
+                return None
             except Exception:
                 if attempt == retries - 1:
                     return None
@@ -114,23 +324,40 @@ class MediaDownloaderService:
         return await self._download_generic(url, prefix)
 
     async def download_as_mp3(self, url: str, prefix: str, retries: int = 2) -> Path | None:
-        """Havoladan MP3 – videodan musiqani ajratib (Instagram/TikTok/Facebook va b.)."""
+        """
+        Havoladan audio – videodan musiqani ajratib (Instagram/TikTok/Facebook va b.). Katta bo'lsa FileTooLarge.
+        Format AUDIO_OUTPUT siyosatiga bog'liq: .mp3 yoki .m4a.
+        """
         platform = self.detect_platform(url)
-        loop = asyncio.get_event_loop()
+        ext = "." + audio_output()[1]
         opts = _ydl_opts(prefix, format_best=False, audio_only=True, platform=platform)
         opts["outtmpl"] = str(TEMP_DIR / f"{prefix}.%(ext)s")
         for attempt in range(max(1, retries)):
             try:
-                info = await loop.run_in_executor(None, lambda u=url, o=opts: self._run_ydl(o, u))
+                async with platform_limits.guard(platform):
+                    # yt-dlp ning ffmpeg (FFmpegExtractAudio) bosqichi ham shu span ichida
+                    with tracing.span("download", platform=platform or "Other", kind="audio", attempt=attempt) as s:
+                        attempt_opts = dict(opts)
+                        tracing.watch_ydl(attempt_opts, s)
+                        info = await download_pool.run(lambda u=url, o=attempt_opts: self._run_ydl(o, u))
                 if not info:
                     continue
-                mp3_path = TEMP_DIR / f"{prefix}.mp3"
-                if mp3_path.exists() and mp3_path.stat().st_size <= MAX_FILE_SIZE_BYTES:
-                    return mp3_path
-                for f in TEMP_DIR.iterdir():
-                    if f.is_file() and f.name.startswith(prefix) and f.suffix.lower() == ".mp3":
-                        if f.stat().st_size <= MAX_FILE_SIZE_BYTES:
-                            return f
+                audio_files = [TEMP_DIR / f"{prefix}{ext}"]
+                audio_files += [
+                    f for f in TEMP_DIR.iterdir()
+                    if f.is_file() and f.name.startswith(prefix) and f.suffix.lower() == ext
+                ]
+                for f in audio_files:
+                    if f.is_file() and f.stat().st_size <= MAX_FILE_SIZE_BYTES:
+                        return f
+                if any(f.is_file() for f in audio_files):
+                    raise FileTooLarge("audio exceeds size limit")
+            except FileTooLarge:
+                cleanup_prefix(prefix)
+                raise
+            except CircuitOpen:
+                # Platforma hozir ishlamayapti – qayta urinish ma'nosiz
+                return None
             except Exception:
                 if attempt == retries - 1:
                     return None
@@ -140,10 +367,12 @@ class MediaDownloaderService:
         """Download YouTube as video (mp4)."""
         opts = _ydl_opts(prefix)
         opts["outtmpl"] = str(TEMP_DIR / f"{prefix}.%(ext)s")
-        opts["format"] = "best[ext=mp4]/best"
+        opts["format"] = size_capped_format("best[ext=mp4]/best")
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(None, lambda: self._run_ydl(opts, url))
+            async with platform_limits.guard("YouTube"):
+                with tracing.span("download", platform="YouTube", kind="video") as s:
+                    tracing.watch_ydl(opts, s)
+                    info = await download_pool.run(lambda: self._run_ydl(opts, url))
             if not info:
                 return None
             ext = info.get("ext", "mp4")
@@ -151,7 +380,10 @@ class MediaDownloaderService:
             if path.exists() and path.stat().st_size <= MAX_FILE_SIZE_BYTES:
                 return path
             if path.exists():
-                path.unlink(missing_ok=True)
+                raise FileTooLarge("downloaded file exceeds size limit")
             return None
+        except FileTooLarge:
+            cleanup_prefix(prefix)
+            raise
         except Exception:
             return None
@@ -1,10 +1,10 @@
 """Detect platform and download media (Instagram, YouTube, TikTok, Pinterest)."""
-import asyncio
 import subprocess
 from pathlib import Path
 from typing import Optional
 
 from config import TEMP_DIR, MAX_FILE_SIZE_BYTES
+from utils.executors import download_pool
 
 
 def _run_yt_dlp(args: list[str], cwd: Optional[Path] = None) -> tuple[bool, str]:
@@ -53,12 +53,10 @@ async def download_media(
     out_dir = TEMP_DIR / str(user_id)
     out_dir.mkdir(parents=True, exist_ok=True)
     out_tpl = str(out_dir / "media.%(ext)s")
-    loop = asyncio.get_event_loop()
 
     if platform == "youtube":
         if want_video:
-            ok, _ = await loop.run_in_executor(
-                None,
+            ok, _ = await download_pool.run(
                 lambda: _run_yt_dlp([
                     "-f", "best[ext=mp4]/best",
                     "-o", out_tpl,
@@ -67,8 +65,7 @@ async def download_media(
                 ], cwd=out_dir),
             )
         else:
-            ok, _ = await loop.run_in_executor(
-                None,
+            ok, _ = await download_pool.run(
                 lambda: _run_yt_dlp([
                     "-x", "--audio-format", "mp3",
                     "-o", out_tpl,
@@ -78,8 +75,7 @@ async def download_media(
             )
     elif platform == "tiktok":
         # Prefer no watermark
-        ok, _ = await loop.run_in_executor(
-            None,
+        ok, _ = await download_pool.run(
             lambda: _run_yt_dlp([
                 "-f", "best[ext=mp4]/best",
                 "-o", out_tpl,
@@ -88,8 +84,7 @@ async def download_media(
             ], cwd=out_dir),
         )
     elif platform in ("instagram", "pinterest"):
-        ok, _ = await loop.run_in_executor(
-            None,
+        ok, _ = await download_pool.run(
             lambda: _run_yt_dlp([
                 "-f", "best",
                 "-o", out_tpl,
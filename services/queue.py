@@ -6,7 +6,6 @@ from typing import Callable, Any
 from config import (
     USER_PARALLEL_LIMIT,
     GLOBAL_PARALLEL_LIMIT,
-    REQUEST_DELAY_SEC,
 )
 
 # Per-user semaphore: max 2 tasks per user
@@ -28,9 +27,8 @@ async def run_with_limits(user_id: int, coro_factory: Callable[[], Any]) -> Any:
     Run a coroutine with:
     - 1 slot from global semaphore (max 5 total)
     - 1 slot from user semaphore (max 2 per user)
-    - 0.5s delay before starting (internal, invisible to user)
+    Tezlik cheklovi middlewares/rate_limit.py da (token bucket) – bu yerda kutish yo'q.
     """
-    await asyncio.sleep(REQUEST_DELAY_SEC)
     async with _global_sem:
         async with _get_user_sem(user_id):
             coro = coro_factory() if callable(coro_factory) else coro_factory
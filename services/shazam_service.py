@@ -1,130 +1,338 @@
 """Shazam recognition via Shazamio. Tries multiple segments (middle, start, end, full) for best result."""
 import asyncio
+import io
+import logging
+import subprocess
+import time
+import wave
 from pathlib import Path
+from typing import Awaitable, Callable
 from shazamio import Shazam
 
-from config import TEMP_DIR
+from config import FFMPEG_LOCATION, SHAZAM_FANOUT, SHAZAM_GLOBAL_BUDGET
+from utils import metrics, tracing
+from utils.executors import metadata_pool, postprocess_pool
+
+logger = logging.getLogger(__name__)
 
 SEGMENT_SEC = 20.0
 MIN_LENGTH_MS = 4000
+# Shazam imzosi 16 kHz mono bilan ishlaydi – undan yuqori sifat kerak emas
+PCM_RATE = 16000
+PCM_WIDTH = 2  # s16le
+
+# Butun bot bo'yicha Shazam serveriga bir vaqtdagi so'rovlar
+_shazam_budget: asyncio.Semaphore | None = None
+
 
+def _get_shazam_budget() -> asyncio.Semaphore:
+    global _shazam_budget
+    if _shazam_budget is None:
+        _shazam_budget = asyncio.Semaphore(SHAZAM_GLOBAL_BUDGET)
+    return _shazam_budget
 
-def _extract_segment(input_path: Path, start_ratio: float, end_ratio: float, suffix: str) -> Path | None:
-    """Extract part of audio: start_ratio..end_ratio (0=start, 1=end). Returns temp path or None."""
+
+def decode_pcm(input_path: Path, timeout: int = 120) -> bytes | None:
+    """Faylni bir marta 16 kHz mono s16le PCM ga decode qiladi (ffmpeg stdout, temp faylsiz)."""
     try:
-        from pydub import AudioSegment
-        audio = AudioSegment.from_file(str(input_path))
-        total_ms = len(audio)
-        if total_ms < MIN_LENGTH_MS:
-            return None
-        start_ms = int(total_ms * start_ratio)
-        end_ms = int(total_ms * end_ratio)
-        want_ms = int(SEGMENT_SEC * 1000)
-        if end_ms - start_ms < MIN_LENGTH_MS:
-            return None
-        segment = audio[start_ms:min(start_ms + want_ms, end_ms)]
-        out = TEMP_DIR / f"shazam_seg_{input_path.stem}_{suffix}.mp3"
-        segment.export(str(out), format="mp3", bitrate="192k")
-        return out if out.exists() else None
+        r = subprocess.run(
+            [
+                FFMPEG_LOCATION or "ffmpeg", "-v", "error", "-i", str(input_path),
+                "-vn", "-ac", "1", "-ar", str(PCM_RATE), "-f", "s16le", "-",
+            ],
+            capture_output=True,
+            timeout=timeout,
+        )
+        return r.stdout if r.returncode == 0 and r.stdout else None
+    except Exception:
+        return None
+
+
+def fetch_pcm_range(
+    stream_url: str,
+    http_headers: dict,
+    start_sec: float,
+    length_sec: float,
+    timeout: int = 60,
+) -> bytes | None:
+    """Masofaviy audio oqimning faqat [start, start+length] qismini o'qib PCM ga decode qiladi (to'liq yuklamasdan)."""
+    cmd = [FFMPEG_LOCATION or "ffmpeg", "-v", "error"]
+    if http_headers:
+        cmd += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in http_headers.items())]
+    cmd += [
+        "-ss", f"{start_sec:.2f}", "-t", f"{length_sec:.2f}", "-i", stream_url,
+        "-vn", "-ac", "1", "-ar", str(PCM_RATE), "-f", "s16le", "-",
+    ]
+    try:
+        r = subprocess.run(cmd, capture_output=True, timeout=timeout)
+        return r.stdout if r.returncode == 0 and r.stdout else None
     except Exception:
         return None
 
 
-def _extract_middle_segment(input_path: Path, segment_sec: float = 22.0) -> Path | None:
-    """Middle part – Shorts/Reels uchun yaxshi."""
-    return _extract_segment(input_path, 0.4, 0.6, "mid")
+def stream_windows(duration: float | None) -> list[tuple[float, float]]:
+    """
+    Oqim uchun (start_sec, length_sec) oynalari – candidate_windows bilan bir xil tartib:
+    o'rta → bosh → oxir. Davomiylik noma'lum bo'lsa birinchi 45s.
+    """
+    if not duration:
+        return [(0.0, 45.0)]
+    min_sec = MIN_LENGTH_MS / 1000
+    if duration < min_sec:
+        return []
+    windows = [
+        (duration * 0.4, min(SEGMENT_SEC, duration * 0.2)),
+        (0.0, min(SEGMENT_SEC, duration * 0.4)),
+        (duration * 0.6, min(SEGMENT_SEC, duration * 0.4)),
+    ]
+    if duration * 0.2 < min_sec:
+        windows = [(0.0, min(45.0, float(duration)))]
+    return list(dict.fromkeys(w for w in windows if w[1] >= min_sec))
 
 
-def _extract_start_segment(input_path: Path) -> Path | None:
-    return _extract_segment(input_path, 0.0, 0.4, "start")
+class RecognitionFailed(Exception):
+    """Shazam so'rovi xato bilan tugadi (tarmoq, API) – "topilmadi" emas, natija cache ga yozilmasligi kerak."""
 
 
-def _extract_end_segment(input_path: Path) -> Path | None:
-    return _extract_segment(input_path, 0.6, 1.0, "end")
+class PcmAudio:
+    """Decode qilingan PCM bufer. Oynalar memoryview orqali kesiladi – nusxa olinmaydi."""
 
+    def __init__(self, data: bytes):
+        self._view = memoryview(data)
 
-def _extract_first_sec(input_path: Path, max_sec: float = 45.0) -> Path | None:
-    """Birinchi max_sec soniya – tezroq tanlash uchun."""
-    try:
-        from pydub import AudioSegment
-        audio = AudioSegment.from_file(str(input_path))
-        total_ms = len(audio)
+    @property
+    def data(self) -> memoryview:
+        return self._view
+
+    @property
+    def duration_ms(self) -> int:
+        return len(self._view) * 1000 // (PCM_RATE * PCM_WIDTH)
+
+    def slice(self, window: tuple[int, int]) -> memoryview:
+        """(start_ms, end_ms) oynasi – nusxasiz memoryview."""
+        bytes_per_ms = PCM_RATE * PCM_WIDTH // 1000
+        start_ms, end_ms = window
+        return self._view[start_ms * bytes_per_ms:end_ms * bytes_per_ms]
+
+    def window(self, start_ratio: float, end_ratio: float, want_sec: float = SEGMENT_SEC) -> tuple[int, int] | None:
+        """start_ratio..end_ratio (0=start, 1=end) oralig'idan boshlab want_sec soniya, (start_ms, end_ms)."""
+        total_ms = self.duration_ms
         if total_ms < MIN_LENGTH_MS:
             return None
-        want_ms = min(int(max_sec * 1000), total_ms)
-        segment = audio[:want_ms]
-        out = TEMP_DIR / f"shazam_seg_{input_path.stem}_first.mp3"
-        segment.export(str(out), format="mp3", bitrate="192k")
-        return out if out.exists() else None
-    except Exception:
-        return None
+        start_ms = int(total_ms * start_ratio)
+        end_ms = int(total_ms * end_ratio)
+        if end_ms - start_ms < MIN_LENGTH_MS:
+            return None
+        return (start_ms, min(start_ms + int(want_sec * 1000), end_ms))
+
+    def head(self, max_sec: float) -> tuple[int, int] | None:
+        total_ms = self.duration_ms
+        if total_ms < MIN_LENGTH_MS:
+            return None
+        return (0, min(int(max_sec * 1000), total_ms))
+
+
+def pcm_to_wav(pcm: memoryview | bytes) -> bytes:
+    """PCM oynani xotirada WAV ga o'raydi (Shazamio bytes qabul qiladi)."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(PCM_WIDTH)
+        w.setframerate(PCM_RATE)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def candidate_windows(audio: PcmAudio) -> list[memoryview]:
+    """Tartib: o'rta (Shorts/Reels uchun yaxshi) → bosh → oxir → birinchi 45s. Bir xil oynalar takrorlanmaydi."""
+    windows = [
+        audio.window(0.4, 0.6, SEGMENT_SEC),
+        audio.window(0.0, 0.4, SEGMENT_SEC),
+        audio.window(0.6, 1.0, SEGMENT_SEC),
+        audio.head(45.0),
+    ]
+    unique = list(dict.fromkeys(w for w in windows if w is not None))
+    return [audio.slice(w) for w in unique]
 
 
 class ShazamService:
     def __init__(self):
         self._shazam = Shazam()
 
-    async def _recognize_path(self, path: Path) -> dict | None:
+    async def _recognize_path(self, path: Path | bytes) -> dict | None:
+        """None – Shazam javob berdi, lekin trek topilmadi. So'rov xatosi istisno sifatida ko'tariladi."""
+        result = await self._shazam.recognize(path if isinstance(path, bytes) else str(path))
+        if not result or "track" not in result:
+            return None
+        track = result["track"]
+        return {
+            "key": track.get("key"),
+            "title": track.get("title", "Unknown"),
+            "subtitle": track.get("subtitle", "Unknown"),
+            "sections": track.get("sections"),
+            "url": track.get("url"),
+            "images": track.get("images"),
+        }
+
+    async def _recognize_budgeted(self, data: Path | bytes) -> dict | None:
+        async with _get_shazam_budget():
+            started = time.monotonic()
+            status = "error"
+            try:
+                with tracing.span("recognize", bytes=len(data) if isinstance(data, bytes) else None) as s:
+                    track = await self._recognize_path(data)
+                    s["hit"] = bool(track)
+                status = "hit" if track else "miss"
+                return track
+            except Exception as e:
+                logger.error("shazam recognize: %s", e)
+                raise RecognitionFailed(str(e)) from e
+            finally:
+                metrics.stage_seconds.observe(
+                    time.monotonic() - started, stage="recognize", platform="Shazam", status=status
+                )
+
+    async def _recognize_window(self, pcm: memoryview | bytes) -> dict | None:
+        """PCM oyna: WAV ga o'rash pool da (event loop bloklanmaydi), keyin Shazam."""
+        wav = await postprocess_pool.run(pcm_to_wav, pcm)
+        return await self._recognize_budgeted(wav)
+
+    async def _first_hit(
+        self,
+        attempts: list[Callable[[], Awaitable[dict | None]]],
+        fanout: int,
+    ) -> dict | None:
+        """
+        Bir vaqtda ko'pi bilan fanout ta urinish; birinchi topilgan trek qaytadi, qolganlari bekor qilinadi.
+        Hech biri topmasa va birortasi xato bo'lsa – RecognitionFailed (haqiqiy "topilmadi" emas).
+        """
+        limit = asyncio.Semaphore(max(1, fanout))
+
+        async def run(attempt):
+            async with limit:
+                return await attempt()
+
+        tasks = [asyncio.create_task(run(a)) for a in attempts]
+        failed: RecognitionFailed | None = None
         try:
-            result = await self._shazam.recognize(str(path))
-            if not result or "track" not in result:
-                return None
-            track = result["track"]
-            return {
-                "key": track.get("key"),
-                "title": track.get("title", "Unknown"),
-                "subtitle": track.get("subtitle", "Unknown"),
-                "sections": track.get("sections"),
-                "url": track.get("url"),
-                "images": track.get("images"),
-            }
-        except Exception:
+            for fut in asyncio.as_completed(tasks):
+                try:
+                    track = await fut
+                except RecognitionFailed as e:
+                    failed = e
+                    continue
+                if track:
+                    return track
+            if failed is not None:
+                raise failed
             return None
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def decode(self, audio_path: Path) -> PcmAudio | None:
+        """Faylni bir marta 16 kHz mono PCM ga decode qilish (postprocess_pool da)."""
+        with tracing.span("decode") as s:
+            data = await postprocess_pool.run(decode_pcm, audio_path)
+            s["bytes"] = len(data) if data else 0
+        return PcmAudio(data) if data else None
 
     async def recognize_file(self, audio_path: Path, use_middle_segment: bool = False) -> dict | None:
         """Recognize from file. use_middle_segment=True: faqat o'rta segment."""
-        path = audio_path
-        segment_path = None
         if use_middle_segment:
-            segment_path = _extract_middle_segment(audio_path, 22.0)
-            if segment_path:
-                path = segment_path
+            audio = await self.decode(audio_path)
+            window = audio.window(0.4, 0.6, 22.0) if audio else None
+            if window is not None:
+                return await self._recognize_window(audio.slice(window))
+        return await self._recognize_budgeted(audio_path)
+
+    async def recognize_pcm(self, audio: PcmAudio, fanout: int | None = None) -> dict | None:
+        """Decode qilingan buferdagi oynalarni sinash: fanout=1 – ketma-ket, aks holda parallel."""
+        fanout = SHAZAM_FANOUT if fanout is None else fanout
+        attempts = [
+            lambda v=view: self._recognize_window(v)
+            for view in candidate_windows(audio)
+        ]
+        # fanout=1 – Semaphore(1) bilan oynalar navbat bilan sinanadi
+        return await self._first_hit(attempts, max(1, fanout))
+
+    async def recognize_stream(self, stream: dict, fanout: int | None = None) -> tuple[dict | None, bool]:
+        """
+        probe_audio_stream natijasidan faqat kerakli oynalarni o'qib aniqlash.
+        Returns (track, fetched): fetched=False – birorta oyna ham o'qilmadi (to'liq yuklashga o'tish kerak).
+        """
+        fanout = SHAZAM_FANOUT if fanout is None else fanout
+        fetched = False
+
+        async def attempt(start: float, length: float) -> dict | None:
+            nonlocal fetched
+            # Asosan tarmoq kutish – CPU pool emas
+            with tracing.span("fetch_pcm", start=start) as s:
+                data = await metadata_pool.run(
+                    fetch_pcm_range, stream["url"], stream.get("http_headers") or {}, start, length
+                )
+                s["bytes"] = len(data) if data else 0
+            if not data or len(data) * 1000 // (PCM_RATE * PCM_WIDTH) < MIN_LENGTH_MS:
+                return None
+            fetched = True
+            return await self._recognize_window(data)
+
+        attempts = [
+            lambda s=start, n=length: attempt(s, n)
+            for start, length in stream_windows(stream.get("duration"))
+        ]
+        track = await self._first_hit(attempts, fanout) if attempts else None
+        return track, fetched or track is not None
+
+    async def recognize_file_thorough(
+        self,
+        audio_path: Path,
+        fanout: int | None = None,
+        audio: PcmAudio | None = None,
+    ) -> dict | None:
+        """
+        Bir nechta segmentda qidirish: to'liq → o'rta → bosh → oxir → birinchi 45s. Haqiqatan topilmasa None;
+        Shazam xatosi tufayli topilmasa RecognitionFailed.
+        fanout > 1 bo'lsa to'liq fayl decode bilan parallel yuboriladi, segmentlar esa bir vaqtda.
+        audio – oldindan decode qilingan PCM (masalan cache kaliti uchun), qayta decode qilinmaydi.
+        """
+        fanout = SHAZAM_FANOUT if fanout is None else fanout
+        has_file = audio_path.exists() and audio_path.stat().st_size > 0
+        if fanout <= 1:
+            failed: RecognitionFailed | None = None
+            # 1) To'liq fayl (qisqa bo'lsa tez)
+            if has_file:
+                try:
+                    track = await self._recognize_budgeted(audio_path)
+                    if track:
+                        return track
+                except RecognitionFailed as e:
+                    failed = e
+            # 2) Segmentlar – fayl faqat bir marta decode qilinadi
+            audio = audio or await self.decode(audio_path)
+            track = await self.recognize_pcm(audio, fanout=1) if audio is not None else None
+            if track is None and failed is not None:
+                raise failed
+            return track
+
+        full = asyncio.create_task(self._recognize_budgeted(audio_path)) if has_file else None
+        decode = asyncio.create_task(self.decode(audio_path)) if audio is None else None
         try:
-            out = await self._recognize_path(path)
-            return out
+            if full is not None and decode is not None:
+                await asyncio.wait({full, decode}, return_when=asyncio.FIRST_COMPLETED)
+            if full is not None and full.done() and not full.exception() and full.result():
+                return full.result()
+            if decode is not None:
+                audio = await decode
+            attempts = [lambda: full] if full is not None else []
+            if audio is not None:
+                attempts += [
+                    lambda v=view: self._recognize_window(v)
+                    for view in candidate_windows(audio)
+                ]
+            return await self._first_hit(attempts, fanout + (1 if full is not None else 0))
         finally:
-            if segment_path and segment_path.exists():
-                try:
-                    segment_path.unlink(missing_ok=True)
-                except Exception:
-                    pass
-
-    async def recognize_file_thorough(self, audio_path: Path) -> dict | None:
-        """Bir nechta segmentda qidirish: to'liq → o'rta → bosh → oxir → birinchi 45s. Haqiqatan topilmasa None."""
-        # 1) To'liq fayl (qisqa bo'lsa tez)
-        if audio_path.exists() and audio_path.stat().st_size > 0:
-            track = await self._recognize_path(audio_path)
-            if track:
-                return track
-        # 2) Segmentlar
-        segments_to_try = [
-            lambda: _extract_middle_segment(audio_path, SEGMENT_SEC),
-            lambda: _extract_start_segment(audio_path),
-            lambda: _extract_end_segment(audio_path),
-            lambda: _extract_first_sec(audio_path, 45.0),
-        ]
-        for get_seg in segments_to_try:
-            seg = get_seg()
-            if not seg or not seg.exists():
-                continue
-            try:
-                track = await self._recognize_path(seg)
-                if track:
-                    return track
-            finally:
-                if seg.exists():
-                    try:
-                        seg.unlink(missing_ok=True)
-                    except Exception:
-                        pass
-        return None
+            for t in (full, decode):
+                if t is not None and not t.done():
+                    t.cancel()
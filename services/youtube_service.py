@@ -1,12 +1,50 @@
 """YouTube: yt-dlp for MP3 with cover, search, and download."""
-import asyncio
+import json
+import logging
 import os
+import time
+from dataclasses import dataclass
 from pathlib import Path
-import yt_dlp
-from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, APIC
 
-from config import TEMP_DIR, MAX_FILE_SIZE_BYTES, FFMPEG_LOCATION
+from config import (
+    TEMP_DIR,
+    MAX_FILE_SIZE_BYTES,
+    FFMPEG_LOCATION,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL_SEC,
+    SEARCH_CACHE_PERSIST,
+    SEARCH_MODE,
+    AUDIO_OUTPUT,
+)
+from database import get_db
+from utils.ttl_cache import TTLCache
+from utils.executors import search_pool, metadata_pool, download_pool, postprocess_pool
+from utils import metrics, platform_limits, tracing
+from services.media_downloader import (
+    PROBE_AUDIO_FORMAT,
+    FileTooLarge,
+    audio_output,
+    audio_stream_info,
+    run_ydl,
+    size_capped_format,
+    with_size_guard,
+)
+from utils.audio_mux import audio_mux_args, run_mux
+from utils.cleanup import cleanup_prefix, cleanup_temp_file
+
+logger = logging.getLogger(__name__)
+
+# Qidiruv natijalari barcha YouTubeService nusxalari uchun umumiy
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SEC)
+SEARCH_CACHE_NAMESPACE = "yt_search"
+
+# writethumbnail natijasi (muqova); qolgan _src.* fayl – audio manba
+THUMB_EXT = (".webp", ".jpg", ".jpeg", ".png")
+
+
+def normalize_query(query: str) -> str:
+    """Cache kaliti: kichik harf, ortiqcha probellarsiz."""
+    return " ".join((query or "").casefold().split())
 
 
 def _ydl_extra_opts() -> dict:
@@ -33,6 +71,15 @@ USER_AGENTS = [
 ]
 
 
+@dataclass
+class AudioDownload:
+    """download_mp3_with_cover natijasi: fayl va yuklash paytida olingan metadata (qayta extract shart emas)."""
+    path: Path
+    title: str
+    uploader: str
+    duration: int | None
+
+
 class YouTubeService:
     def __init__(self):
         self._opts_base = {
@@ -45,7 +92,7 @@ class YouTubeService:
             **_ydl_extra_opts(),
         }
 
-    def _run_ydl(self, opts: dict, url_or_extract: str) -> dict | list:
+    def _run_ydl(self, opts: dict, url_or_extract: str, download: bool = True) -> dict | list:
         # Har bir so'rovda yangi User-Agent
         try:
             ua = ua_gen.random if ua_gen else random.choice(USER_AGENTS)
@@ -58,21 +105,66 @@ class YouTubeService:
             "Accept-Language": "en-us,en;q=0.5",
             "Sec-Fetch-Mode": "navigate",
         }
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            return ydl.extract_info(url_or_extract, download=True)
+        return run_ydl(opts, url_or_extract, download=download)
 
     async def search(self, query: str, max_results: int = 10) -> list[dict]:
-        """Search YouTube, return list of {id, title, duration}."""
-        out = Path(TEMP_DIR) / "search_%(id)s.%(ext)s"
-        opts = {
-            **self._opts_base,
-            "default_search": "ytsearch10",
-            "format": "best",
-            "outtmpl": str(out),
-            "skip_download": True,
-        }
-        loop = asyncio.get_event_loop()
-        info = await loop.run_in_executor(None, lambda: self._run_ydl(opts, query))
+        """Search YouTube, return list of {id, title, duration}. Natijalar TTL + LRU cache da saqlanadi."""
+        key = normalize_query(query)
+        cached = search_cache.get(key)
+        if cached is None and SEARCH_CACHE_PERSIST:
+            cached = await self._load_persisted_search(key)
+        if cached is not None:
+            return cached[:max_results]
+        result = await self._search_live(query)
+        if result:
+            search_cache.set(key, result)
+            if SEARCH_CACHE_PERSIST:
+                await self._persist_search(key, result)
+        return result[:max_results]
+
+    async def _load_persisted_search(self, key: str) -> list[dict] | None:
+        try:
+            raw = await get_db().kv_get(SEARCH_CACHE_NAMESPACE, key)
+        except Exception as e:
+            logger.error("search cache load: %s", e)
+            return None
+        if raw is None:
+            return None
+        result = json.loads(raw)
+        search_cache.set(key, result)
+        return result
+
+    async def _persist_search(self, key: str, result: list[dict]) -> None:
+        try:
+            await get_db().kv_set(SEARCH_CACHE_NAMESPACE, key, json.dumps(result), SEARCH_CACHE_TTL_SEC)
+        except Exception as e:
+            logger.error("search cache save: %s", e)
+
+    async def _search_live(self, query: str, mode: str = SEARCH_MODE) -> list[dict]:
+        """
+        yt-dlp orqali to'g'ridan-to'g'ri qidiruv (ytsearch10).
+        mode="flat" – faqat playlist metadata (id, title, duration), formatlar resolve qilinmaydi.
+        mode="full" – har bir natija to'liq extract qilinadi (eski, sekin yo'l).
+        """
+        if mode == "flat":
+            opts = {
+                **self._opts_base,
+                "extract_flat": "in_playlist",
+                "skip_download": True,
+            }
+            download = False
+        else:
+            out = Path(TEMP_DIR) / "search_%(id)s.%(ext)s"
+            opts = {
+                **self._opts_base,
+                "format": "best",
+                "outtmpl": str(out),
+                "skip_download": True,
+            }
+            download = True
+        with tracing.span("search", mode=mode):
+            async with platform_limits.guard("YouTube", limited=False):
+                info = await search_pool.run(lambda: self._run_ydl(opts, f"ytsearch10:{query}", download=download))
         entries = info.get("entries") or []
         result = []
         for e in entries:
@@ -82,10 +174,10 @@ class YouTubeService:
             result.append({
                 "id": vid,
                 "video_id": vid,
-                "title": e.get("title", "Unknown")[:60],
+                "title": (e.get("title") or "Unknown")[:60],
                 "duration": e.get("duration"),
             })
-            if len(result) >= max_results:
+            if len(result) >= 10:
                 break
         return result
 
@@ -96,90 +188,88 @@ class YouTubeService:
         title: str = "",
         artist: str = "",
         album: str = "",
-    ) -> tuple[Path | None, Path | None]:
+        policy: str = AUDIO_OUTPUT,
+    ) -> AudioDownload | None:
         """
-        Download audio as MP3 and cover image. Embed cover into MP3.
-        Returns (path_to_mp3, path_to_cover) or (None, None) on error.
+        Download audio + thumbnail, then one ffmpeg pass writes the final file: audio, scaled cover, title/artist tags.
+        Empty title/artist are filled from YouTube metadata (title, channel).
+        policy: "mp3" – MP3 192k; "native" – AAC stream-copy (.m4a), see AUDIO_POLICIES.
+        Returns AudioDownload (path, title, uploader, duration) or None on error; FileTooLarge if over the limit.
         """
         out_dir = Path(TEMP_DIR)
-        mp3_path = out_dir / f"{output_name}.mp3"
-        thumb_path = out_dir / f"{output_name}_thumb.jpg"
-
+        audio_opts, ext = audio_output(policy)
         opts = {
             **self._opts_base,
-            "format": "bestaudio/best",
-            "outtmpl": str(out_dir / f"{output_name}.%(ext)s"),
+            "format": audio_opts["format"],
+            "outtmpl": str(out_dir / f"{output_name}_src.%(ext)s"),
             "concurrent_fragment_downloads": 8,
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
-            ],
             "writethumbnail": True,
-            "postprocessor_args": {"ffmpeg": ["-y"]},
             **_ydl_extra_opts(),
         }
+        with_size_guard(opts)
 
+        source = thumb = None
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(None, lambda: self._run_ydl(opts, url))
+            async with platform_limits.guard("YouTube"):
+                with tracing.span("download", platform="YouTube", kind="audio") as s:
+                    tracing.watch_ydl(opts, s)
+                    info = await download_pool.run(lambda: self._run_ydl(opts, url))
             if not info:
-                return (None, None)
-
-            # yt-dlp + FFmpegExtractAudio produces output_name.mp3
-            mp3_path = out_dir / f"{output_name}.mp3"
-            if not mp3_path.exists():
-                for f in out_dir.glob(f"{output_name}.*"):
-                    if f.suffix.lower() == ".mp3":
-                        mp3_path = f
-                        break
-
-            # Thumbnail
-            for ext in ["webp", "jpg", "png"]:
-                p = out_dir / f"{output_name}.{ext}"
-                if p.exists() and p != mp3_path:
-                    thumb_path = out_dir / f"{output_name}_thumb.jpg"
-                    try:
-                        from PIL import Image
-                        img = Image.open(p).convert("RGB")
-                        img.save(thumb_path, "JPEG", quality=95)
-                        p.unlink(missing_ok=True)
-                    except Exception:
-                        thumb_path = p
-                    break
-
-            if mp3_path.exists():
-                size = mp3_path.stat().st_size
-                if size > MAX_FILE_SIZE_BYTES:
-                    mp3_path.unlink(missing_ok=True)
-                    return (None, None)
-                # Embed cover into MP3
-                if thumb_path.exists():
-                    try:
-                        audio = MP3(str(mp3_path), ID3=ID3)
-                        try:
-                            audio.add_tags()
-                        except Exception:
-                            pass
-                        with open(thumb_path, "rb") as f:
-                            audio.tags.add(
-                                APIC(
-                                    encoding=3,
-                                    mime="image/jpeg",
-                                    type=3,
-                                    desc="Cover",
-                                    data=f.read(),
-                                )
-                            )
-                        audio.save()
-                    except Exception:
-                        pass
-                return (mp3_path, thumb_path if thumb_path.exists() else None)
-            return (None, None)
+                return None
+
+            for f in out_dir.glob(f"{output_name}_src.*"):
+                if f.suffix.lower() in THUMB_EXT:
+                    thumb = f
+                elif f.suffix.lower() not in (".part", ".ytdl"):
+                    source = f
+            if not source:
+                return None
+
+            uploader = info.get("uploader") or info.get("channel") or ""
+            acodec = info.get("acodec") or ""
+            audio_path = out_dir / f"{output_name}.{ext}"
+
+            def mux_args(cover: Path | None) -> list[str]:
+                return audio_mux_args(
+                    str(source), str(audio_path), ext,
+                    # Manba allaqachon kerakli kodekda bo'lsa – nusxa
+                    copy_audio=acodec.startswith("mp4a") if ext == "m4a" else acodec == "mp3",
+                    cover=str(cover) if cover else None,
+                    title=title or info.get("title") or "",
+                    artist=artist or uploader,
+                    album=album,
+                )
+
+            started = time.monotonic()
+            with tracing.span("transcode", codec=ext, cover=bool(thumb)) as s:
+                ok = await postprocess_pool.run(run_mux, mux_args(thumb))
+                if not ok and thumb:
+                    # Muqova o'qilmadi – muqovasiz
+                    ok = await postprocess_pool.run(run_mux, mux_args(None))
+                if ok and audio_path.exists():
+                    s["bytes"] = audio_path.stat().st_size
+            metrics.stage_seconds.observe(
+                time.monotonic() - started, stage="transcode", platform="YouTube", status="ok" if ok else "error"
+            )
+            if not ok or not audio_path.exists():
+                return None
+            if audio_path.stat().st_size > MAX_FILE_SIZE_BYTES:
+                raise FileTooLarge("audio exceeds size limit")
+            duration = info.get("duration")
+            return AudioDownload(
+                path=audio_path,
+                title=info.get("title") or "",
+                uploader=uploader,
+                duration=int(duration) if duration else None,
+            )
+        except FileTooLarge:
+            cleanup_prefix(output_name)
+            raise
         except Exception:
-            return (None, None)
+            return None
+        finally:
+            cleanup_temp_file(source)
+            cleanup_temp_file(thumb)
 
     async def get_video_info(self, video_id: str) -> dict | None:
         """Get info for a single video by ID or URL."""
@@ -190,24 +280,42 @@ class YouTubeService:
             "extract_flat": False,
         }
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(None, lambda: self._run_ydl(opts, url))
+            async with platform_limits.guard("YouTube", limited=False):
+                with tracing.span("extract", platform="YouTube"):
+                    info = await metadata_pool.run(lambda: self._run_ydl(opts, url))
             return info
         except Exception:
             return None
 
+    async def probe_audio_stream(self, url: str, fmt: str = PROBE_AUDIO_FORMAT) -> dict | None:
+        """
+        Yuklamasdan audio oqim (stream yuborish va Shazam uchun) – cookie va User-Agent bilan.
+        Xato bo'lsa None; yuklashga o'tiladi, shuning uchun breaker ga yozilmaydi.
+        """
+        opts = {**self._opts_base, "format": fmt, "noplaylist": True, "skip_download": True}
+        try:
+            async with platform_limits.guard("YouTube", limited=False, count=False):
+                with tracing.span("probe", platform="YouTube"):
+                    info = await metadata_pool.run(lambda: self._run_ydl(opts, url, download=False))
+        except Exception:
+            return None
+        return audio_stream_info(info)
+
     async def download_video(self, url: str, output_name: str) -> Path | None:
         """Download best video to file. Returns path or None."""
         out_dir = Path(TEMP_DIR)
         opts = {
             **self._opts_base,
-            "format": "best[ext=mp4]/best",
+            "format": size_capped_format("best[ext=mp4]/best"),
             "outtmpl": str(out_dir / f"{output_name}.%(ext)s"),
             "concurrent_fragment_downloads": 8,
         }
+        with_size_guard(opts)
         try:
-            loop = asyncio.get_event_loop()
-            info = await loop.run_in_executor(None, lambda: self._run_ydl(opts, url))
+            async with platform_limits.guard("YouTube"):
+                with tracing.span("download", platform="YouTube", kind="video") as s:
+                    tracing.watch_ydl(opts, s)
+                    info = await download_pool.run(lambda: self._run_ydl(opts, url))
             if not info:
                 return None
             ext = info.get("ext", "mp4")
@@ -215,7 +323,10 @@ class YouTubeService:
             if path.exists() and path.stat().st_size <= MAX_FILE_SIZE_BYTES:
                 return path
             if path.exists():
-                path.unlink(missing_ok=True)
+                raise FileTooLarge("downloaded file exceeds size limit")
             return None
+        except FileTooLarge:
+            cleanup_prefix(output_name)
+            raise
         except Exception:
             return None
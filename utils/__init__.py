@@ -1,4 +1,4 @@
-from .queue_manager import queue_manager
+from .queue_manager import queue_manager, Priority
 from .cleanup import cleanup_temp_file
 
-__all__ = ["queue_manager", "cleanup_temp_file"]
+__all__ = ["queue_manager", "Priority", "cleanup_temp_file"]
@@ -0,0 +1,89 @@
+"""
+Adaptiv parallel limit (AIMD): yuklashlar birinchi baytgacha p95 vaqti va yt-dlp xato ulushi sog'lom bo'lsa limit +1,
+yomonlashsa limit × backoff. YouTube throttling paytida tez pasayadi, katta serverda asta-sekin ko'tariladi.
+"""
+import logging
+from collections import deque
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def p95(values) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class AdaptiveLimiter:
+    """
+    observe(latency_sec, ok) har bir tugagan bosqichdan keyin chaqiriladi. Har window ta yangi natijada bir marta qaror:
+    - p95 > latency_target yoki xato ulushi > error_rate → limit = max(min, limit × backoff)
+    - aks holda, limit to'liq ishlatilgan bo'lsa (saturated()) → limit + 1 (max gacha)
+    Limit o'zgarganda on_change(limit) chaqiriladi va oyna tozalanadi (eski natijalar qayta hisoblanmaydi).
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        error_rate: float,
+        window: int = 20,
+        backoff: float = 0.7,
+        on_change: Callable[[int], None] | None = None,
+        saturated: Callable[[], bool] | None = None,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.latency_target = latency_target
+        self.error_rate = error_rate
+        self.window = max(1, window)
+        self.backoff = backoff
+        self.on_change = on_change
+        self.saturated = saturated
+        self._samples: deque[tuple[float, bool]] = deque(maxlen=self.window)
+        self.increases = 0
+        self.decreases = 0
+
+    def observe(self, latency_sec: float, ok: bool) -> None:
+        self._samples.append((latency_sec, ok))
+        if len(self._samples) < self.window:
+            return
+        latency = p95(s[0] for s in self._samples)
+        errors = sum(1 for s in self._samples if not s[1]) / len(self._samples)
+        if latency > self.latency_target or errors > self.error_rate:
+            new_limit = max(self.min_limit, int(self.limit * self.backoff))
+        elif self.saturated is None or self.saturated():
+            new_limit = min(self.max_limit, self.limit + 1)
+        else:
+            new_limit = self.limit
+        self._samples.clear()
+        if new_limit == self.limit:
+            return
+        if new_limit > self.limit:
+            self.increases += 1
+        else:
+            self.decreases += 1
+        logger.info(
+            "adaptive limit %d -> %d (p95=%.1fs, errors=%.0f%%)", self.limit, new_limit, latency, errors * 100
+        )
+        self.limit = new_limit
+        if self.on_change:
+            self.on_change(new_limit)
+
+    def stats(self) -> dict:
+        samples = list(self._samples)
+        return {
+            "limit": self.limit,
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "p95_sec": p95(s[0] for s in samples),
+            "error_rate": sum(1 for s in samples if not s[1]) / len(samples) if samples else 0.0,
+            "samples": len(samples),
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
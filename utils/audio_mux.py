@@ -0,0 +1,77 @@
+"""
+Yakuniy audio fayl bitta ffmpeg o'tishida: audio (kodlash yoki nusxa) + kichraytirilgan muqova + title/artist teglari.
+Fayl yo'li ham, oqimli yuborish (pipe:1) ham shu argumentlardan foydalanadi.
+"""
+import subprocess
+
+from config import FFMPEG_LOCATION
+
+# Muqova kengligi (px); Telegram pleyeri uchun yetarli, ID3 hajmi kichik qoladi
+COVER_MAX_PX = 500
+
+
+def _is_remote(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+
+def audio_mux_args(
+    source: str,
+    output: str,
+    codec: str = "mp3",
+    copy_audio: bool = False,
+    bitrate: str = "192k",
+    cover: str | None = None,
+    title: str = "",
+    artist: str = "",
+    album: str = "",
+    http_headers: dict | None = None,
+) -> list[str]:
+    """
+    ffmpeg argumentlari. source/cover – fayl yoki URL; output – fayl yo'li yoki "pipe:1" (faqat mp3).
+    codec: "mp3" yoki "m4a"; copy_audio=True – manba allaqachon shu kodekda, qayta kodlanmaydi.
+    """
+    args = ["-v", "error", "-y"]
+    if _is_remote(source):
+        args += ["-reconnect", "1", "-reconnect_streamed", "1"]
+        if http_headers:
+            args += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in http_headers.items())]
+    args += ["-i", source]
+    if cover:
+        args += ["-i", cover]
+    args += ["-map", "0:a:0"]
+    if copy_audio:
+        args += ["-c:a", "copy"]
+    elif codec == "m4a":
+        args += ["-c:a", "aac", "-b:a", bitrate]
+    else:
+        args += ["-c:a", "libmp3lame", "-b:a", bitrate]
+    if cover:
+        args += [
+            "-map", "1:v:0",
+            "-vf", f"scale='min({COVER_MAX_PX},iw)':-2",
+            "-c:v", "mjpeg", "-pix_fmt", "yuvj420p", "-q:v", "3",
+            "-disposition:v:0", "attached_pic",
+        ]
+    for key, value in (("title", title), ("artist", artist), ("album", album)):
+        if value:
+            args += ["-metadata", f"{key}={value}"]
+    if codec == "m4a":
+        args += ["-f", "mp4"]
+    else:
+        args += ["-id3v2_version", "3", "-f", "mp3"]
+    args.append(output)
+    return args
+
+
+def run_mux(args: list[str], timeout: int = 300) -> bool:
+    """audio_mux_args bilan ffmpeg ni ishga tushirish (postprocess_pool da). True – muvaffaqiyatli."""
+    try:
+        r = subprocess.run(
+            [FFMPEG_LOCATION or "ffmpeg", *args],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            timeout=timeout,
+        )
+        return r.returncode == 0
+    except Exception:
+        return False
@@ -1,4 +1,5 @@
 """Clean temporary files after use."""
+import glob
 from pathlib import Path
 
 from config import TEMP_DIR
@@ -16,6 +17,19 @@ def cleanup_temp_file(path: Path | str | None) -> None:
             pass
 
 
+def cleanup_prefix(prefix: str) -> None:
+    """
+    TEMP_DIR dagi shu vazifa fayllari: prefix.* va prefix_* (.part, .ytdl, _src, muqova va h.k.).
+    Faqat prefix* emas – md_v_12_3 boshqa vazifaning md_v_12_34.* fayllarini o'chirmasligi kerak.
+    """
+    try:
+        for pattern in (f"{glob.escape(prefix)}.*", f"{glob.escape(prefix)}_*"):
+            for f in TEMP_DIR.glob(pattern):
+                cleanup_temp_file(f)
+    except OSError:
+        pass
+
+
 def cleanup_user_temp(user_id: int) -> None:
     """Remove temporary files for user (call after sending file)."""
     try:
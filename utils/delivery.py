@@ -0,0 +1,246 @@
+"""Tayyor media yuborish: avval file_id cache, bo'lmasa yuklab olib Telegramga yuborish va file_id ni saqlash."""
+import hashlib
+import logging
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.types import Message
+
+from config import AUDIO_STREAM_UPLOAD, AUDIO_OUTPUT, MAX_FILE_SIZE_BYTES
+from services import YouTubeService
+from utils import file_cache, metrics, platform_limits, tracing
+from utils.cleanup import cleanup_temp_file
+from utils.executors import download_pool
+from utils.ffmpeg_stream import FFmpegStreamFile, mp3_transcode_args
+from utils.filename import sanitize_audio_filename
+from utils.locales import get_text
+from utils.queue_manager import queue_manager, Priority
+from utils.singleflight import SingleFlight
+from utils.uploads import send_from_disk
+
+# file_cache "kind" qiymatlari: chiqish formati o'zgarsa eski file_id lar ishlatilmaydi
+MP3_KIND = "mp3_192"
+M4A_KIND = "m4a"
+# AUDIO_OUTPUT=native – M4A (AAC nusxa); MP3 bilan aralashmasligi uchun alohida kind
+AUDIO_KIND = M4A_KIND if AUDIO_OUTPUT == "native" else MP3_KIND
+VIDEO_KIND = "video"
+
+VIDEO_EXT = (".mp4", ".webm", ".mov", ".mkv", ".avi")
+
+# Oqimli yuborishda: faqat http(s) audio formatlar (ffmpeg to'g'ridan-to'g'ri o'qiy oladi)
+STREAM_AUDIO_FORMAT = "bestaudio[protocol^=http]/bestaudio"
+MP3_BITRATE_BPS = 192_000
+
+class UploadUncertain(Exception):
+    """Upload Telegram tomonida xato bilan tugadi, lekin fayl qabul qilingan bo'lishi mumkin – qayta yuborilmaydi."""
+
+    # jobs: qayta navbatga qo'yilmaydi (foydalanuvchi faylni ikki marta olmasin)
+    retryable = False
+
+
+youtube_svc = YouTubeService()
+logger = logging.getLogger(__name__)
+
+# Bir xil media bir vaqtda faqat bir marta yuklanadi; qolganlar leader yuborgan file_id ni oladi
+mp3_flights = SingleFlight()
+video_flights = SingleFlight()
+
+
+def format_duration(duration: int | float | None) -> str:
+    if not duration:
+        return "—"
+    duration = int(duration)
+    return f"{duration // 60}:{duration % 60:02d}"
+
+
+def tagged_media_id(vid: str, title: str = "", artist: str = "") -> str:
+    """YouTube id; title/artist berilgan bo'lsa – ularning qisqa hash i qo'shiladi (YouTube teglari bilan fayl – vid)."""
+    if not (title or artist):
+        return vid
+    digest = hashlib.sha1(f"{title}\x00{artist}".encode("utf-8")).hexdigest()[:16]
+    return f"{vid}#{digest}"
+
+
+async def deliver_youtube_mp3(
+    bot: Bot,
+    chat_id: int,
+    user_id: int,
+    vid: str,
+    lang: str,
+    prefix: str,
+    title: str = "",
+    artist: str = "",
+) -> Message | None:
+    """
+    YouTube videoni MP3 qilib yuboradi. title berilmasa YouTube nomi ishlatiladi.
+    Cache hit – yuklashsiz, file_id orqali. Muvaffaqiyatsiz bo'lsa None.
+    """
+    def caption(t: str, a: str, duration: int | float | None) -> str:
+        return get_text(
+            lang, "mp3_caption",
+            title=t, artist=a, album="", duration=format_duration(duration),
+        )
+
+    async def send_file_id(entry: dict) -> Message:
+        return await bot.send_audio(
+            chat_id,
+            entry["file_id"],
+            caption=caption(title or entry["title"] or "Track", artist or entry["artist"] or "", entry["duration"]),
+            parse_mode="HTML",
+        )
+
+    # title/artist faylning o'ziga (ID3 teglar, Telegram title/performer) yoziladi – boshqa teglar bilan
+    # so'ralgan trek boshqa fayl: cache va single-flight kaliti ularni ham o'z ichiga oladi
+    media_id = tagged_media_id(vid, title, artist)
+    with tracing.span("send_cached", platform="YouTube") as span:
+        sent = await file_cache.send_cached(send_file_id, "YouTube", media_id, AUDIO_KIND)
+        span["hit"] = bool(sent)
+    if sent:
+        return sent
+
+    url = f"https://www.youtube.com/watch?v={vid}"
+    duration: int | None = None
+
+    async def stream() -> Message | None:
+        """Yuklab olmasdan: audio oqim → ffmpeg → upload. Bo'lmasa None (fayl yo'liga o'tiladi)."""
+        nonlocal title, duration
+        info = await youtube_svc.probe_audio_stream(url, fmt=STREAM_AUDIO_FORMAT)
+        if not info:
+            return None
+        if info.get("duration") and info["duration"] * MP3_BITRATE_BPS / 8 > MAX_FILE_SIZE_BYTES:
+            return None
+        title = title or (info.get("title") or "Track")[:50]
+        duration = int(info["duration"]) if info.get("duration") else None
+        upload = FFmpegStreamFile(
+            mp3_transcode_args(
+                info["url"], info.get("http_headers"),
+                cover=info.get("thumbnail"), title=title, artist=artist or info.get("uploader") or "",
+            ),
+            filename=sanitize_audio_filename(title, artist),
+        )
+        started = time.monotonic()
+        uncertain: Exception | None = None
+        with tracing.span("stream_upload", platform="YouTube") as span:
+            try:
+                # googlevideo transferi ham platforma limiti va breaker ostida (probe esa count=False)
+                telegram_error: Exception | None = None
+                async with platform_limits.guard("YouTube"):
+                    transfer_started = time.monotonic()
+                    try:
+                        sent = await bot.send_audio(
+                            chat_id, upload,
+                            caption=caption(title, artist, duration), parse_mode="HTML",
+                            title=title, performer=artist or None, duration=duration,
+                        )
+                    except Exception as e:
+                        if upload.aborted is None:
+                            # Manba o'qildi, xato Telegram tomonida – YouTube uchun xato emas
+                            telegram_error = e
+                        else:
+                            # aiohttp/aiogram ffmpeg xatosini o'rab yuborishi mumkin – breaker asl sababni ko'rsin
+                            download_pool.report(
+                                (upload.first_byte_at or time.monotonic()) - transfer_started, upload.aborted
+                            )
+                            raise upload.aborted from e
+                    download_pool.report((upload.first_byte_at or time.monotonic()) - transfer_started)
+                if telegram_error is not None:
+                    raise telegram_error
+            except Exception as e:
+                logger.error("mp3 stream %s (%d bytes): %s", vid, upload.sent_bytes, e)
+                span["error"] = type(e).__name__
+                sent = None
+                # ffmpeg/manba xatosi yoki hech narsa ketmagan – fayl yo'liga o'tish xavfsiz. Aks holda Telegram
+                # faylni qabul qilgan bo'lishi mumkin (masalan javobni kutishda timeout) – qayta yubormaymiz
+                if upload.aborted is None and upload.sent_bytes:
+                    uncertain = e
+            span["bytes"] = upload.sent_bytes
+        metrics.stage_seconds.observe(
+            time.monotonic() - started, stage="stream", platform="YouTube", status="ok" if sent else "error"
+        )
+        if uncertain is not None:
+            raise UploadUncertain(f"stream upload {vid}: {uncertain}") from uncertain
+        return sent
+
+    async def download_and_send() -> Message | None:
+        nonlocal title, duration
+        audio = await youtube_svc.download_mp3_with_cover(url, prefix, title, artist, "")
+        if not audio or not audio.path.exists():
+            return None
+        try:
+            title = title or (audio.title or "Track")[:50]
+            duration = audio.duration
+            return await send_from_disk(
+                audio.path,
+                lambda f: bot.send_audio(
+                    chat_id, f, caption=caption(title, artist, duration), parse_mode="HTML",
+                    title=title, performer=artist or None, duration=duration,
+                ),
+                filename=sanitize_audio_filename(title, artist, audio.path.suffix),
+                platform="YouTube",
+            )
+        finally:
+            cleanup_temp_file(audio.path)
+
+    async def produce() -> Message | None:
+        async with queue_manager(user_id, Priority.AUDIO):
+            # Oqim har doim MP3 ga qayta kodlaydi – native siyosatda CPU tejash uchun fayl yo'li (AAC nusxa)
+            sent = await stream() if AUDIO_STREAM_UPLOAD and AUDIO_KIND == MP3_KIND else None
+            if sent is None:
+                sent = await download_and_send()
+        if sent:
+            await file_cache.remember(
+                sent, "YouTube", media_id, AUDIO_KIND, title=title, artist=artist, duration=duration
+            )
+        return sent
+
+    sent, leader = await mp3_flights.run(("YouTube", media_id, AUDIO_KIND), produce)
+    if leader or sent is None:
+        return sent
+    return await send_file_id(file_cache.entry_from_message(sent))
+
+
+async def deliver_video(
+    bot: Bot,
+    chat_id: int,
+    user_id: int,
+    platform: str,
+    media_id: str,
+    download: Callable[[], Awaitable[Path | None]],
+) -> Message | None:
+    """
+    Video (yoki rasm) yuborish. download() – cache miss bo'lganda faylni yuklaydigan coroutine.
+    Fayl turiga qarab video yoki document; diskdan bo'laklab, umumiy upload budjeti doirasida yuboriladi.
+    """
+    async def send_file_id(entry: dict) -> Message:
+        if entry["media_type"] == "video":
+            return await bot.send_video(chat_id, entry["file_id"])
+        return await bot.send_document(chat_id, entry["file_id"])
+
+    with tracing.span("send_cached", platform=platform) as span:
+        sent = await file_cache.send_cached(send_file_id, platform, media_id, VIDEO_KIND)
+        span["hit"] = bool(sent)
+    if sent:
+        return sent
+
+    async def produce() -> Message | None:
+        # Katta video tezkor audio so'rovlardan keyin navbatga qo'yiladi
+        async with queue_manager(user_id, Priority.VIDEO):
+            path = await download()
+            if not path or not path.exists():
+                return None
+            try:
+                if path.suffix.lower() in VIDEO_EXT:
+                    sent = await send_from_disk(path, lambda f: bot.send_video(chat_id, f), platform=platform)
+                else:
+                    sent = await send_from_disk(path, lambda f: bot.send_document(chat_id, f), platform=platform)
+            finally:
+                cleanup_temp_file(path)
+        await file_cache.remember(sent, platform, media_id, VIDEO_KIND)
+        return sent
+
+    sent, leader = await video_flights.run((platform, media_id, VIDEO_KIND), produce)
+    if leader or sent is None:
+        return sent
+    return await send_file_id(file_cache.entry_from_message(sent))
@@ -0,0 +1,133 @@
+"""
+Ish turiga qarab alohida, chegaralangan executorlar – sekin yuklash qidiruv threadlarini band qilmaydi:
+search / metadata / download – yt-dlp (tarmoq), postprocess – ffmpeg jarayonlari, hash va WAV o'rash.
+Hammasi thread pool: og'ir ish ffmpeg jarayonida yoki GIL ni bo'shatadigan C kodida (hashlib) bajariladi,
+fork qilingan Python jarayoni foyda bermaydi, natija (masalan o'nlab MB PCM) esa pickle qilinmaydi.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from config import SEARCH_POOL_SIZE, METADATA_POOL_SIZE, DOWNLOAD_POOL_SIZE, CPU_POOL_SIZE
+from utils.platform_limits import is_platform_failure
+
+# Worker thread ichidagi vazifa report_latency() bilan o'z o'lchovini beradi
+_local = threading.local()
+
+
+def report_latency(seconds: float) -> None:
+    """
+    Vazifa ichidan (worker thread da) chaqiriladi: observer larga bajarilish vaqti o'rniga shu qiymat beriladi.
+    Masalan yuklash – birinchi baytgacha vaqt: fayl hajmiga bog'liq emas.
+    """
+    _local.latency = seconds
+
+
+class NamedExecutor:
+    """
+    Nomlangan executor: faol workerlar, navbatdagi vazifalar va har bir vazifa vaqti (navbat + bajarilish).
+    """
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = max(1, size)
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.wall_total = 0.0
+        self.wall_max = 0.0
+        # observer(latency_sec, ok) – har bir vazifa tugagach (masalan adaptiv limit uchun).
+        # latency – report_latency() qiymati yoki bajarilish vaqti (pool navbati kirmaydi);
+        # ok=False – faqat platforma xatosi (is_platform_failure: tarmoq, timeout, 5xx); FileTooLarge,
+        # yopiq video va h.k. xato emas
+        self.observers: list[Callable[[float, bool], None]] = []
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix=self.name)
+        return self._pool
+
+    def _tracked(self, sample: dict, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self.active += 1
+        _local.latency = None
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            reported = _local.latency
+            sample["latency"] = reported if reported is not None else time.monotonic() - started
+            with self._lock:
+                self.active -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """fn(*args) ni shu pool da bajarish."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        self.pending += 1
+        sample: dict = {}
+        error: BaseException | None = None
+        try:
+            return await loop.run_in_executor(self._get_pool(), self._tracked, sample, fn, *args)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            wall = time.monotonic() - started
+            self.pending -= 1
+            self.completed += 1
+            self.failed += 0 if error is None else 1
+            self.wall_total += wall
+            self.wall_max = max(self.wall_max, wall)
+            # Bekor qilingan (worker hali tugamagan) vazifa – namuna yo'q
+            if "latency" in sample:
+                self.report(sample["latency"], error)
+
+    def report(self, latency: float, error: BaseException | None = None) -> None:
+        """Pool dan tashqarida bajarilgan shu turdagi ish (masalan oqimli yuklash) natijasi – observer larga."""
+        ok = error is None or not is_platform_failure(error)
+        for observer in self.observers:
+            observer(latency, ok)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "active": self.active,
+            "queued": max(0, self.pending - self.active),
+            "completed": self.completed,
+            "failed": self.failed,
+            "wall_avg_sec": self.wall_total / self.completed if self.completed else 0.0,
+            "wall_max_sec": self.wall_max,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# YouTube qidiruv
+search_pool = NamedExecutor("search", SEARCH_POOL_SIZE)
+# Yuklamasdan ma'lumot olish: get_video_info, audio oqim probe, Shazam uchun qisqa oynalar
+metadata_pool = NamedExecutor("metadata", METADATA_POOL_SIZE)
+# To'liq yuklashlar (yt-dlp + uning ffmpeg postprocessorlari)
+download_pool = NamedExecutor("download", DOWNLOAD_POOL_SIZE)
+# Media ishlari: ffmpeg (PCM decode, mux, audio ajratish), fayl/PCM hash, WAV o'rash.
+# Hajmi – bir vaqtda ishlaydigan ffmpeg jarayonlari chegarasi
+postprocess_pool = NamedExecutor("postprocess", CPU_POOL_SIZE)
+
+POOLS = (search_pool, metadata_pool, download_pool, postprocess_pool)
+
+
+def stats() -> dict:
+    return {pool.name: pool.stats() for pool in POOLS}
+
+
+def shutdown() -> None:
+    for pool in POOLS:
+        pool.shutdown()
@@ -0,0 +1,97 @@
+"""
+ffmpeg stdout → Telegram multipart upload: transcode natijasi diskka yozilmasdan bo'laklab yuboriladi.
+Birinchi bayt tezroq ketadi, vaqtinchalik papka deyarli ishlatilmaydi.
+"""
+import asyncio
+import time
+from typing import AsyncGenerator
+
+from aiogram import Bot
+from aiogram.types import InputFile
+
+from config import FFMPEG_LOCATION, MAX_FILE_SIZE_BYTES
+from utils.audio_mux import audio_mux_args
+
+
+class StreamAborted(Exception):
+    """ffmpeg xato bilan tugadi, hech narsa chiqarmadi yoki hajm chegarasidan oshdi."""
+
+
+class StreamTooLarge(StreamAborted):
+    """Oqim MAX_FILE_SIZE_BYTES dan oshdi – platforma ishlayapti."""
+
+    platform_ok = True
+
+
+class StreamSourceFailed(StreamAborted):
+    """ffmpeg manbani o'qiy olmadi (403, throttling, uzilish) – platforma xatosi sifatida hisoblanadi."""
+
+    platform_failure = True
+
+
+def mp3_transcode_args(
+    stream_url: str,
+    http_headers: dict | None = None,
+    bitrate: str = "192k",
+    cover: str | None = None,
+    title: str = "",
+    artist: str = "",
+) -> list[str]:
+    """Masofaviy audio oqimni MP3 ga o'girib (muqova va teglar bilan) stdout ga chiqarish uchun ffmpeg argumentlari."""
+    return audio_mux_args(
+        stream_url, "pipe:1", "mp3", bitrate=bitrate,
+        cover=cover, title=title, artist=artist, http_headers=http_headers,
+    )
+
+
+class FFmpegStreamFile(InputFile):
+    """
+    aiogram InputFile: read() ffmpeg ni ishga tushiradi va stdout bo'laklarini upload ga uzatadi.
+    Xato yoki max_bytes dan oshish – StreamAborted, upload so'rovi bekor bo'ladi (Telegramga yarim fayl ketmaydi).
+    aborted – ffmpeg/manba tomonidagi sabab (upload xatosidan farqlash uchun), first_byte_at – birinchi bo'lak vaqti.
+    """
+
+    def __init__(
+        self,
+        ffmpeg_args: list[str],
+        filename: str,
+        max_bytes: int = MAX_FILE_SIZE_BYTES,
+        chunk_size: int = 64 * 1024,
+    ):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.ffmpeg_args = ffmpeg_args
+        self.max_bytes = max_bytes
+        self.sent_bytes = 0
+        self.first_byte_at: float | None = None
+        self.aborted: StreamAborted | None = None
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        proc = await asyncio.create_subprocess_exec(
+            FFMPEG_LOCATION or "ffmpeg", *self.ffmpeg_args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            while True:
+                chunk = await proc.stdout.read(self.chunk_size)
+                if not chunk:
+                    break
+                if self.first_byte_at is None:
+                    self.first_byte_at = time.monotonic()
+                self.sent_bytes += len(chunk)
+                if self.sent_bytes > self.max_bytes:
+                    self.aborted = StreamTooLarge("stream exceeds size limit")
+                    raise self.aborted
+                yield chunk
+            if await proc.wait() != 0:
+                self.aborted = StreamSourceFailed(f"ffmpeg exited with {proc.returncode}")
+                raise self.aborted
+            if not self.sent_bytes:
+                self.aborted = StreamSourceFailed("ffmpeg produced no output")
+                raise self.aborted
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                # stdout o'qilmay qolsa transport EOF ni ko'rmaydi va wait() osilib qoladi
+                await proc.communicate()
@@ -0,0 +1,98 @@
+"""Telegram file_id cache: bir marta yuborilgan media qayta yuklanmaydi, file_id orqali yuboriladi."""
+import logging
+from typing import Awaitable, Callable
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+_stats = {"hits": 0, "misses": 0, "invalidated": 0}
+
+
+async def lookup(platform: str, media_id: str, kind: str) -> dict | None:
+    """(platform, media_id, kind) uchun saqlangan file_id va metadata. Topilmasa None."""
+    try:
+        entry = await get_db().get_cached_file(platform, media_id, kind)
+    except Exception as e:
+        logger.error("file_cache lookup: %s", e)
+        entry = None
+    _stats["hits" if entry else "misses"] += 1
+    return entry
+
+
+def entry_from_message(sent: Message | None) -> dict | None:
+    """Yuborilgan xabardan cache yozuvi: file_id, media_type, title, artist, duration."""
+    if sent is None:
+        return None
+    for media_type in ("audio", "video", "document"):
+        media = getattr(sent, media_type, None)
+        if media is not None:
+            return {
+                "file_id": media.file_id,
+                "media_type": media_type,
+                "title": getattr(media, "title", None) or "",
+                "artist": getattr(media, "performer", None) or "",
+                "duration": getattr(media, "duration", None),
+            }
+    return None
+
+
+async def remember(
+    sent: Message | None,
+    platform: str,
+    media_id: str,
+    kind: str,
+    title: str = "",
+    artist: str = "",
+    duration: int | float | None = None,
+) -> None:
+    """Yuborilgan xabardan file_id ni olib saqlaydi (audio, video yoki document)."""
+    entry = entry_from_message(sent)
+    if entry is None:
+        return
+    duration = duration or entry["duration"]
+    try:
+        await get_db().set_cached_file(
+            platform, media_id, kind, entry["file_id"], entry["media_type"],
+            title=title or entry["title"], artist=artist or entry["artist"],
+            duration=int(duration) if duration else None,
+        )
+    except Exception as e:
+        logger.error("file_cache remember: %s", e)
+
+
+async def invalidate(platform: str, media_id: str, kind: str) -> None:
+    _stats["invalidated"] += 1
+    try:
+        await get_db().delete_cached_file(platform, media_id, kind)
+    except Exception as e:
+        logger.error("file_cache invalidate: %s", e)
+
+
+async def send_cached(
+    send: Callable[[dict], Awaitable[Message]],
+    platform: str,
+    media_id: str,
+    kind: str,
+) -> Message | None:
+    """
+    Cache hit bo'lsa send(entry) orqali file_id bilan yuboradi va xabarni qaytaradi.
+    Telegram eski file_id ni rad etsa yozuv o'chiriladi va None qaytadi (oddiy yuklashga o'tiladi).
+    """
+    entry = await lookup(platform, media_id, kind)
+    if not entry:
+        return None
+    try:
+        return await send(entry)
+    except TelegramBadRequest:
+        await invalidate(platform, media_id, kind)
+        return None
+
+
+def stats() -> dict:
+    """hits, misses, invalidated va hit_ratio."""
+    total = _stats["hits"] + _stats["misses"]
+    return {**_stats, "hit_ratio": _stats["hits"] / total if total else 0.0}
@@ -0,0 +1,193 @@
+"""
+Yuklash vazifalari: handler vazifani yaratadi, bajaruvchi (runner) esa handler modulida ro'yxatdan o'tadi.
+JOB_QUEUE=0 – vazifa shu zahoti handler ichida bajariladi (avvalgidek).
+JOB_QUEUE=1 – vazifa SQLite jobs jadvaliga yoziladi; worker.py jarayonlari uni lease bilan olib bajaradi.
+Restart/redeploy da lease muddati o'tgan vazifani boshqa worker qayta oladi (at-least-once).
+"""
+import asyncio
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+
+from config import (
+    JOB_QUEUE,
+    JOB_WORKER_CONCURRENCY,
+    JOB_LEASE_SEC,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_DELAY_SEC,
+    JOB_POLL_SEC,
+)
+from database import get_db
+from utils import tracing
+from utils.locales import get_text
+
+logger = logging.getLogger(__name__)
+
+# Vazifa turlari
+YT_MP3 = "yt_mp3"          # YouTube MP3, status xabari tugmalar bilan qoladi
+YT_TRACK = "yt_track"      # YouTube MP3 (variant / Shazam natijasi), status xabari o'chiriladi
+YT_VIDEO = "yt_video"
+MEDIA_VIDEO = "media_video"
+
+
+@dataclass
+class Job:
+    id: int | None
+    type: str
+    payload: dict
+    user_id: int
+    chat_id: int
+    status_message_id: int | None
+    attempts: int = 0
+
+    @property
+    def lang(self) -> str:
+        return self.payload.get("lang", "uz")
+
+
+Runner = Callable[[Bot, Job], Awaitable[None]]
+_runners: dict[str, Runner] = {}
+
+
+def runner(job_type: str) -> Callable[[Runner], Runner]:
+    """Decorator: vazifa turi uchun bajaruvchini ro'yxatdan o'tkazish."""
+    def register(fn: Runner) -> Runner:
+        _runners[job_type] = fn
+        return fn
+    return register
+
+
+async def submit(
+    bot: Bot,
+    job_type: str,
+    payload: dict,
+    user_id: int,
+    chat_id: int,
+    status_message_id: int | None,
+) -> None:
+    """Vazifani navbatga qo'yish (JOB_QUEUE=1) yoki shu yerda bajarish."""
+    job = Job(None, job_type, payload, user_id, chat_id, status_message_id)
+    if not JOB_QUEUE:
+        # Handler trace (MetricsMiddleware) davom etadi
+        with tracing.trace(job_type, user_id=user_id, job=job_type):
+            await _runners[job_type](bot, job)
+        return
+    job.id = await get_db().enqueue_job(
+        job_type, json.dumps(payload), user_id, chat_id, status_message_id, max_attempts=JOB_MAX_ATTEMPTS
+    )
+
+
+async def after_send(job: Job, *steps: Awaitable) -> None:
+    """
+    Media yuborilgandan keyingi qadamlar (status xabarini tahrirlash/o'chirish, pending URL).
+    Ular xatosi vazifani qayta navbatga qo'ymasligi kerak – aks holda media yana yuboriladi.
+    """
+    for step in steps:
+        try:
+            await step
+        except Exception as e:
+            logger.error("job %s (%s) after send: %s", job.id, job.type, e)
+
+
+async def _notify_failure(bot: Bot, job: Job) -> None:
+    if not job.status_message_id:
+        return
+    try:
+        await bot.edit_message_text(
+            get_text(job.lang, "error_friendly"),
+            chat_id=job.chat_id,
+            message_id=job.status_message_id,
+            parse_mode="HTML",
+        )
+    except Exception:
+        pass
+
+
+async def _keep_lease(job_id: int, owner: str) -> None:
+    db = get_db()
+    while True:
+        await asyncio.sleep(JOB_LEASE_SEC / 3)
+        try:
+            if not await db.extend_job_lease(job_id, owner, JOB_LEASE_SEC):
+                logger.warning("job %s: lease lost", job_id)
+                return
+        except Exception as e:
+            logger.error("job %s lease: %s", job_id, e)
+
+
+def _job_from_row(row: dict) -> Job:
+    return Job(
+        row["id"], row["type"], json.loads(row["payload"]),
+        row["user_id"], row["chat_id"], row["status_message_id"], row["attempts"],
+    )
+
+
+async def _expire_stale(bot: Bot, worker_id: str) -> None:
+    """Lease muddati o'tgan (worker o'lgan) va urinishlari tugagan vazifalar – fail_job kabi xabar beriladi."""
+    try:
+        rows = await get_db().expire_jobs(f"{worker_id}:expire:{uuid.uuid4().hex[:12]}")
+    except Exception as e:
+        logger.error("expire_jobs: %s", e)
+        return
+    for row in rows:
+        logger.error("job %s (%s): lease expired after %d attempts", row["id"], row["type"], row["attempts"])
+        await _notify_failure(bot, _job_from_row(row))
+
+
+async def _execute(bot: Bot, row: dict, owner: str) -> None:
+    db = get_db()
+    job = _job_from_row(row)
+    run = _runners.get(job.type)
+    if run is None:
+        logger.error("job %s: unknown type %s", job.id, job.type)
+        await db.fail_job(job.id, owner, f"unknown type {job.type}", retry_delay=None)
+        return
+    heartbeat = asyncio.create_task(_keep_lease(job.id, owner))
+    try:
+        with tracing.trace(job.type, user_id=job.user_id, job=job.type, job_id=job.id, attempt=job.attempts):
+            await run(bot, job)
+    except Exception as e:
+        logger.error("job %s (%s) attempt %d: %s", job.id, job.type, job.attempts, e)
+        # retryable=False – natija noaniq (masalan media yuborilgan bo'lishi mumkin), qayta bajarilmaydi
+        retry_delay = JOB_RETRY_DELAY_SEC * job.attempts if getattr(e, "retryable", True) else None
+        requeued = await db.fail_job(job.id, owner, str(e)[:500], retry_delay=retry_delay)
+        if not requeued:
+            await _notify_failure(bot, job)
+        return
+    finally:
+        heartbeat.cancel()
+    await db.complete_job(job.id, owner)
+
+
+async def work(bot: Bot, worker_id: str, concurrency: int = JOB_WORKER_CONCURRENCY) -> None:
+    """Worker sikli: bo'sh slot bo'lganda navbatdan vazifa olib bajaradi."""
+    db = get_db()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    tasks: set[asyncio.Task] = set()
+    logger.info("worker %s started, concurrency=%d", worker_id, concurrency)
+    try:
+        while True:
+            await slots.acquire()
+            await _expire_stale(bot, worker_id)
+            owner = f"{worker_id}:{uuid.uuid4().hex[:12]}"
+            try:
+                row = await db.claim_job(owner, JOB_LEASE_SEC)
+            except Exception as e:
+                logger.error("claim_job: %s", e)
+                row = None
+            if row is None:
+                slots.release()
+                await asyncio.sleep(JOB_POLL_SEC)
+                continue
+            task = asyncio.create_task(_execute(bot, row, owner))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
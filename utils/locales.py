@@ -13,6 +13,7 @@ TEXTS = {
         "error": "❌ Xatolik yuz berdi. Keyinroq urinib ko'ring.",
         "error_friendly": "😔 Biroz muammo bo‘ldi. Iltimos, keyinroq qayta urinib ko‘ring.",
         "file_too_big": "❌ Fayl hajmi chegaradan oshdi.",
+        "rate_limited": "⏳ So‘rovlar juda ko‘p. Biroz kutib, qayta urinib ko‘ring.",
         "shazam_result": (
             "🎵 <b>{title}</b>\n"
             "👤 {artist}\n"
@@ -76,6 +77,7 @@ TEXTS = {
         "error": "❌ Произошла ошибка. Попробуйте позже.",
         "error_friendly": "😔 Что-то пошло не так. Попробуйте позже.",
         "file_too_big": "❌ Размер файла превышает лимит.",
+        "rate_limited": "⏳ Слишком много запросов. Подождите немного и попробуйте снова.",
         "shazam_result": (
             "🎵 <b>{title}</b>\n"
             "👤 {artist}\n"
@@ -139,6 +141,7 @@ TEXTS = {
         "error": "❌ An error occurred. Try again later.",
         "error_friendly": "😔 Something went wrong. Please try again later.",
         "file_too_big": "❌ File size exceeds limit.",
+        "rate_limited": "⏳ Too many requests. Please wait a moment and try again.",
         "shazam_result": (
             "🎵 <b>{title}</b>\n"
             "👤 {artist}\n"
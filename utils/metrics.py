@@ -0,0 +1,211 @@
+"""
+Prometheus matn formatidagi metrikalar (/metrics). Tashqi kutubxonasiz: hisoblagich va histogrammalar shu yerda,
+boshqa modullarning stats() qiymatlari (cache, executor, navbat, breaker, ...) esa so'rov paytida yig'iladi.
+webhook rejimida asosiy aiohttp ilovaga, polling va worker da alohida kichik serverga ulanadi (METRICS_PORT).
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterable
+
+from aiohttp import web
+
+from config import TEMP_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, value: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + value
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labelnames: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket hisoblagichlari..., sum, count]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        row = self._values.get(key)
+        if row is None:
+            row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with histogram.time(stage=...): – blok davomiyligi (istisno bo'lsa ham) yoziladi."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for key, row in self._values.items():
+            for bound, value in zip(self.buckets, row):
+                lines.append(f"{self.name}_bucket{_labels((*self.labelnames, 'le'), (*key, bound))} {value}")
+            lines.append(f"{self.name}_bucket{_labels((*self.labelnames, 'le'), (*key, '+Inf'))} {row[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {row[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+# Handler bo'yicha update lar (status: ok / error)
+updates = Counter("bot_updates_total", "Handled updates per handler", ("handler", "event", "status"))
+handler_seconds = Histogram("bot_handler_seconds", "Handler duration", ("handler",))
+# Navbatda (scheduler) slot kutish vaqti
+queue_wait_seconds = Histogram("bot_queue_wait_seconds", "Time waiting for a global/user slot", ("priority",))
+# Bosqichlar: download, transcode, upload, stream, recognize
+stage_seconds = Histogram("bot_stage_seconds", "Pipeline stage duration per platform", ("stage", "platform", "status"))
+
+METRICS = (updates, handler_seconds, queue_wait_seconds, stage_seconds)
+
+
+class _Gauges:
+    """So'rov paytida yig'iladigan qiymatlar: bir nom ostida bir nechta label to'plami."""
+
+    def __init__(self):
+        self._series: dict[str, tuple[str, str, list[str]]] = {}
+
+    def add(self, name: str, kind: str, doc: str, value: float, **labels) -> None:
+        _, _, lines = self._series.setdefault(name, (kind, doc, []))
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {float(value)}")
+
+    def collect(self) -> list[str]:
+        out = []
+        for name, (kind, doc, lines) in self._series.items():
+            out += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}", *lines]
+        return out
+
+
+def _temp_dir_bytes() -> int:
+    total = 0
+    for f in TEMP_DIR.rglob("*"):
+        try:
+            if f.is_file():
+                total += f.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+async def _runtime_gauges() -> _Gauges:
+    # Modullar shu yerda import qilinadi: ular o'zlari metrics ni import qiladi (aylanma import bo'lmasin)
+    from database import get_db
+    from services.youtube_service import search_cache
+    from utils import executors, file_cache, platform_limits, recognition_cache
+    from utils.delivery import mp3_flights, video_flights
+    from utils.queue_manager import scheduler, limiter
+    from utils.rate_limit import limiter as rate_limiter
+    from utils.uploads import upload_budget
+
+    g = _Gauges()
+    for cache, stats in (
+        ("file_id", file_cache.stats()),
+        ("search", search_cache.stats()),
+        ("recognition", recognition_cache.stats()),
+    ):
+        g.add("bot_cache_hits_total", "counter", "Cache hits", stats["hits"] + stats.get("negative_hits", 0), cache=cache)
+        g.add("bot_cache_misses_total", "counter", "Cache misses", stats["misses"], cache=cache)
+        g.add("bot_cache_hit_ratio", "gauge", "Cache hit ratio since start", stats["hit_ratio"], cache=cache)
+
+    for flight, sf in (("mp3", mp3_flights), ("video", video_flights)):
+        stats = sf.stats()
+        g.add("bot_singleflight_in_flight", "gauge", "Downloads in progress", stats["in_flight"], kind=flight)
+        g.add("bot_singleflight_coalesced_total", "counter", "Requests served by another download", stats["coalesced"], kind=flight)
+
+    for pool, stats in executors.stats().items():
+        g.add("bot_executor_size", "gauge", "Executor workers", stats["size"], pool=pool)
+        g.add("bot_executor_active", "gauge", "Executor busy workers", stats["active"], pool=pool)
+        g.add("bot_executor_queued", "gauge", "Executor queued tasks", stats["queued"], pool=pool)
+        g.add("bot_executor_saturation", "gauge", "active / size", stats["active"] / stats["size"], pool=pool)
+        g.add("bot_executor_failed_total", "counter", "Executor failed tasks", stats["failed"], pool=pool)
+
+    stats = scheduler.stats()
+    g.add("bot_queue_running", "gauge", "Jobs holding a global slot", stats["running"])
+    g.add("bot_queue_limit", "gauge", "Current global parallel limit", stats["global_limit"])
+    for priority, n in stats["queued_by_priority"].items():
+        g.add("bot_queue_waiting", "gauge", "Jobs waiting for a slot", n, priority=priority)
+    g.add("bot_adaptive_limit", "gauge", "Adaptive limiter target", limiter.stats()["limit"])
+
+    for platform, stats in platform_limits.stats().items():
+        g.add("bot_platform_active", "gauge", "Active calls per platform", stats["active"], platform=platform)
+        g.add("bot_platform_limit", "gauge", "Parallel limit per platform", stats["limit"], platform=platform)
+        g.add("bot_circuit_open", "gauge", "1 if the platform circuit is not closed", stats["state"] != "closed", platform=platform)
+        g.add("bot_circuit_rejected_total", "counter", "Calls rejected by an open circuit", stats["rejected"], platform=platform)
+
+    stats = rate_limiter.stats()
+    for result in ("admitted", "delayed", "rejected"):
+        g.add("bot_rate_limit_total", "counter", "Rate limiter decisions", stats[result], result=result)
+
+    stats = upload_budget.stats()
+    g.add("bot_upload_bytes_in_flight", "gauge", "Bytes being uploaded to Telegram", stats["in_flight"])
+    g.add("bot_upload_waiting", "gauge", "Uploads waiting for byte budget", stats["waiting"])
+
+    try:
+        for status, n in (await get_db().job_counts()).items():
+            g.add("bot_jobs", "gauge", "Jobs by status", n, status=status)
+    except Exception as e:
+        logger.error("metrics job_counts: %s", e)
+
+    g.add("bot_temp_dir_bytes", "gauge", "Bytes in TEMP_DIR", _temp_dir_bytes())
+    return g
+
+
+async def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.collect()
+    try:
+        lines += (await _runtime_gauges()).collect()
+    except Exception as e:
+        logger.error("metrics: %s", e)
+    return "\n".join(lines) + "\n"
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=await render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_server(port: int) -> web.AppRunner:
+    """Polling / worker rejimi uchun alohida /metrics server."""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    return runner
@@ -0,0 +1,238 @@
+"""
+Platforma bo'yicha alohida parallel limit va circuit breaker: Instagram ishlamay qolsa YouTube navbati to'xtamaydi.
+Breaker: oxirgi natijalarda xato ulushi chegaradan oshsa – ochiq (darhol CircuitOpen), cooldown dan keyin
+half-open – bitta sinov so'rovi; muvaffaqiyatli bo'lsa yopiladi, aks holda yana ochiladi.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from config import (
+    PLATFORM_PARALLEL_LIMIT,
+    PLATFORM_LIMITS,
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_ERROR_RATE,
+    BREAKER_COOLDOWN_SEC,
+)
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# yt-dlp xabaridagi "HTTP Error 503" kabi kod (asl istisno har doim ham yetib kelmaydi)
+HTTP_STATUS_RE = re.compile(r"http error (\d{3})")
+# Platforma tomonidagi vaqtincha muammo belgilari (xabar matni, kichik harf)
+TRANSIENT_MARKERS = (
+    "timed out", "timeout", "connection reset", "connection refused", "connection aborted",
+    "remote end closed", "temporarily unavailable", "too many requests", "rate-limit", "rate limit",
+    "not a bot", "name or service not known", "network is unreachable",
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Platforma vaqtincha o'chirilgan – so'rov yuborilmadi."""
+
+    def __init__(self, platform: str, retry_after: float):
+        super().__init__(f"{platform} circuit open, retry after {retry_after:.0f}s")
+        self.platform = platform
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: int, min_calls: int, error_rate: float, cooldown: float):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.opened = 0
+        self.rejected = 0
+        self._results: deque[bool] = deque(maxlen=window)
+        self._probe_in_flight = False
+
+    def allow(self) -> None:
+        """So'rovdan oldin: ruxsat bo'lmasa CircuitOpen."""
+        if self.state == OPEN:
+            left = self.opened_at + self.cooldown - time.monotonic()
+            if left > 0:
+                self.rejected += 1
+                raise CircuitOpen(self.name, left)
+            self.state = HALF_OPEN
+            logger.info("circuit %s half-open", self.name)
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self.cooldown)
+            self._probe_in_flight = True
+
+    def record(self, ok: bool) -> None:
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            if ok:
+                self.state = CLOSED
+                self._results.clear()
+                logger.info("circuit %s closed", self.name)
+            else:
+                self._open()
+            return
+        self._results.append(ok)
+        if len(self._results) < self.min_calls:
+            return
+        errors = sum(1 for r in self._results if not r) / len(self._results)
+        if errors >= self.error_rate:
+            self._open()
+
+    def check(self) -> None:
+        """allow() ning kuzatuvchi varianti: ochiq bo'lsa CircuitOpen, lekin half-open sinov so'rovini band qilmaydi."""
+        if self.state == OPEN:
+            left = self.opened_at + self.cooldown - time.monotonic()
+            if left > 0:
+                self.rejected += 1
+                raise CircuitOpen(self.name, left)
+
+    def release_probe(self) -> None:
+        """Sinov so'rovi natijasiz tugadi (bekor qilindi) – keyingi so'rov sinov bo'ladi."""
+        self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+        self._results.clear()
+        logger.warning("circuit %s open for %.0fs", self.name, self.cooldown)
+
+    def stats(self) -> dict:
+        results = list(self._results)
+        return {
+            "state": self.state,
+            "error_rate": sum(1 for r in results if not r) / len(results) if results else 0.0,
+            "calls": len(results),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class PlatformPool:
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.breaker = CircuitBreaker(name, BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_COOLDOWN_SEC)
+        self._semaphore: asyncio.Semaphore | None = None
+        self.active = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, **self.breaker.stats()}
+
+
+_pools: dict[str, PlatformPool] = {}
+
+
+def _causes(e: BaseException):
+    """Istisno va uning sabablari (yt-dlp DownloadError.exc_info, ExtractorError.cause, __cause__)."""
+    seen = set()
+    while e is not None and id(e) not in seen and len(seen) < 8:
+        seen.add(id(e))
+        yield e
+        exc_info = getattr(e, "exc_info", None)
+        inner = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        cause = getattr(e, "cause", None)
+        e = inner or (cause if isinstance(cause, BaseException) else None) or e.__cause__ or e.__context__
+
+
+def is_platform_failure(e: BaseException) -> bool:
+    """
+    Breaker (va adaptiv limit) uchun xato: faqat tarmoq, timeout, 5xx/429 yoki bot tekshiruvi.
+    Foydalanuvchi havolasi sabab bo'lgan xatolar (yopiq/o'chirilgan video, qo'llab-quvvatlanmagan URL,
+    ExtractorError(expected=True), 404) va platform_ok=True istisnolar platformani o'chirmaydi;
+    platform_failure=True (masalan oqim manbasi o'qilmadi) – har doim xato.
+    """
+    for exc in _causes(e):
+        if getattr(exc, "platform_ok", False):
+            return False
+        if getattr(exc, "platform_failure", False):
+            return True
+        if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        status = getattr(exc, "status", None) or getattr(exc, "code", None)
+        if isinstance(status, int) and 100 <= status < 600:
+            return status >= 500 or status == 429
+    message = str(e).lower()
+    m = HTTP_STATUS_RE.search(message)
+    if m:
+        status = int(m.group(1))
+        return status >= 500 or status == 429
+    return any(marker in message for marker in TRANSIENT_MARKERS)
+
+
+def get_pool(platform: str | None) -> PlatformPool:
+    name = platform or "Other"
+    pool = _pools.get(name)
+    if pool is None:
+        pool = PlatformPool(name, PLATFORM_LIMITS.get(name, PLATFORM_PARALLEL_LIMIT))
+        _pools[name] = pool
+    return pool
+
+
+@asynccontextmanager
+async def guard(platform: str | None, limited: bool = True, count: bool = True):
+    """
+    yt-dlp chaqiruvini o'rash: breaker ochiq bo'lsa darhol CircuitOpen, aks holda platforma slotini olib bajaradi.
+    Blok ichidagi istisno qayta ko'tariladi; xato sifatida faqat is_platform_failure() lari hisoblanadi.
+    limited=False – faqat breaker (qisqa so'rovlar, masalan qidiruv, yuklashlar slotini band qilmaydi).
+    count=False – natija breaker ga yozilmaydi (ixtiyoriy urinishlar, masalan oqim probe: xato bo'lsa yuklashga o'tiladi).
+    limited=True bloklar davomiyligi – bot_stage_seconds{stage="download"}.
+    """
+    pool = get_pool(platform)
+    if not count:
+        pool.breaker.check()
+    else:
+        pool.breaker.allow()
+    # count=False – half-open sinovi olinmagan, bo'shatish ham kerak emas
+    recorded = not count
+    started = 0.0
+    try:
+        if limited:
+            await pool._get_semaphore().acquire()
+        pool.active += 1
+        started = time.monotonic()
+        try:
+            yield pool
+        finally:
+            pool.active -= 1
+            if limited:
+                pool._get_semaphore().release()
+        if count:
+            pool.breaker.record(True)
+        recorded = True
+        if limited:
+            metrics.stage_seconds.observe(time.monotonic() - started, stage="download", platform=pool.name, status="ok")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # Platforma javob berdi, so'rov o'zi rad etildi (fayl juda katta, yopiq video, ...) – muvaffaqiyat
+        if count:
+            pool.breaker.record(not is_platform_failure(e))
+        recorded = True
+        if limited and started:
+            metrics.stage_seconds.observe(time.monotonic() - started, stage="download", platform=pool.name, status="error")
+        raise
+    finally:
+        if not recorded:
+            pool.breaker.release_probe()
+
+
+def stats() -> dict:
+    return {name: pool.stats() for name, pool in _pools.items()}
@@ -1,48 +1,80 @@
-"""asyncio Queue-based rate limiting: per-user (2) and global (5) parallel tasks."""
-import asyncio
-from config import USER_PARALLEL_LIMIT, GLOBAL_PARALLEL_LIMIT, REQUEST_DELAY_SEC
+"""
+Navbat: per-user (2) va global parallel vazifalar – adolatli scheduler (utils/scheduler.py) orqali.
+Global limit ADAPTIVE_LIMIT=1 bo'lsa download_pool natijalariga qarab o'zgaradi (utils/adaptive_limit.py).
+"""
+from config import (
+    USER_PARALLEL_LIMIT,
+    GLOBAL_PARALLEL_LIMIT,
+    GLOBAL_PARALLEL_MIN,
+    GLOBAL_PARALLEL_MAX,
+    ADAPTIVE_LIMIT,
+    ADAPTIVE_LATENCY_TARGET_SEC,
+    ADAPTIVE_ERROR_RATE,
+    ADAPTIVE_WINDOW,
+    ADAPTIVE_BACKOFF,
+)
+from utils import metrics, tracing
+from utils.adaptive_limit import AdaptiveLimiter
+from utils.executors import download_pool
+from utils.scheduler import FairScheduler, Priority, Ticket
 
-# Global semaphore: max 5 concurrent downloads
-_global_semaphore: asyncio.Semaphore | None = None
-# Per-user: max 2 concurrent tasks per user
-_user_semaphores: dict[int, asyncio.Semaphore] = {}
-_lock = asyncio.Lock()
+scheduler = FairScheduler(GLOBAL_PARALLEL_LIMIT, USER_PARALLEL_LIMIT)
 
 
-def _get_global_semaphore() -> asyncio.Semaphore:
-    global _global_semaphore
-    if _global_semaphore is None:
-        _global_semaphore = asyncio.Semaphore(GLOBAL_PARALLEL_LIMIT)
-    return _global_semaphore
+def _set_global_limit(limit: int) -> None:
+    scheduler.global_limit = limit
 
 
-def _get_user_semaphore(user_id: int) -> asyncio.Semaphore:
-    if user_id not in _user_semaphores:
-        _user_semaphores[user_id] = asyncio.Semaphore(USER_PARALLEL_LIMIT)
-    return _user_semaphores[user_id]
+def _saturated() -> bool:
+    """Limit haqiqatan ham to'liq ishlatilyaptimi – bo'sh turgan limitni oshirishdan foyda yo'q."""
+    return scheduler.queued() > 0 or scheduler.running >= scheduler.global_limit
 
 
-async def acquire(user_id: int) -> None:
-    """Acquire global + user semaphore. Call before starting a download task."""
-    await asyncio.sleep(REQUEST_DELAY_SEC)
-    await _get_global_semaphore().acquire()
-    await _get_user_semaphore(user_id).acquire()
+limiter = AdaptiveLimiter(
+    GLOBAL_PARALLEL_LIMIT,
+    GLOBAL_PARALLEL_MIN,
+    GLOBAL_PARALLEL_MAX,
+    latency_target=ADAPTIVE_LATENCY_TARGET_SEC,
+    error_rate=ADAPTIVE_ERROR_RATE,
+    window=ADAPTIVE_WINDOW,
+    backoff=ADAPTIVE_BACKOFF,
+    on_change=_set_global_limit,
+    saturated=_saturated,
+)
+if ADAPTIVE_LIMIT:
+    download_pool.observers.append(limiter.observe)
 
 
-def release(user_id: int) -> None:
-    """Release global + user semaphore. Call when task finishes."""
-    _get_global_semaphore().release()
-    _get_user_semaphore(user_id).release()
+def current_limit() -> int:
+    """Hozirgi samarali global limit (monitoring uchun)."""
+    return scheduler.global_limit
+
+
+async def acquire(user_id: int, priority: Priority = Priority.AUDIO) -> Ticket:
+    """Global va user limiti bo'shaganda qabul qilinadi. Call before starting a download task."""
+    with tracing.span("queue_wait", priority=priority.name.lower()) as s:
+        ticket = await scheduler.acquire(user_id, priority)
+        s["position"] = ticket.position
+    metrics.queue_wait_seconds.observe(ticket.wait_sec, priority=priority.name.lower())
+    return ticket
+
+
+def release(ticket: Ticket) -> None:
+    """Call when task finishes."""
+    scheduler.release(ticket)
 
 
 class queue_manager:
-    """Context manager: acquire on enter, release on exit."""
+    """Context manager: acquire on enter, release on exit. `as ticket` – navbatdagi o'rni va kutish vaqti."""
 
-    def __init__(self, user_id: int):
+    def __init__(self, user_id: int, priority: Priority = Priority.AUDIO):
         self.user_id = user_id
+        self.priority = priority
+        self.ticket: Ticket | None = None
 
-    async def __aenter__(self) -> None:
-        await acquire(self.user_id)
+    async def __aenter__(self) -> Ticket:
+        self.ticket = await acquire(self.user_id, self.priority)
+        return self.ticket
 
     async def __aexit__(self, *args) -> None:
-        release(self.user_id)
+        release(self.ticket)
@@ -0,0 +1,89 @@
+"""
+So'rovlar tezligi: har bir user va butun bot uchun token bucket (burst ruxsat etiladi).
+Token bor – darhol o'tadi; yo'q – keyingi token kutiladi; kutish juda uzoq bo'lsa (spam) – rad etiladi.
+"""
+import asyncio
+import time
+
+from config import (
+    RATE_USER_PER_MIN,
+    RATE_USER_BURST,
+    RATE_GLOBAL_PER_SEC,
+    RATE_GLOBAL_BURST,
+    RATE_MAX_WAIT_SEC,
+    STATE_MEMORY_SIZE,
+)
+from utils.ttl_cache import TTLCache
+
+
+class TokenBucket:
+    """rate – soniyasiga token, burst – maksimal zaxira. Band qilingan tokenlar manfiy balans sifatida navbat hosil qiladi."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class RateLimiter:
+    def __init__(self, user_rate: float, user_burst: int, global_rate: float, global_burst: int, max_wait: float):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_wait = max_wait
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        # Bo'sh turgan user bucket vaqt o'tib baribir to'ladi – uni unutish to'liq bucket bilan bir xil
+        self._users = TTLCache(STATE_MEMORY_SIZE, user_burst / user_rate + max_wait)
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+
+    def _user_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+        # Har bir murojaatda TTL yangilanadi
+        self._users.set(user_id, bucket)
+        return bucket
+
+    async def admit(self, user_id: int) -> bool:
+        """True – ruxsat (kerak bo'lsa kutib), False – rad etildi (token sarflanmaydi)."""
+        now = time.monotonic()
+        bucket = self._user_bucket(user_id)
+        wait = max(bucket.wait_time(now), self.global_bucket.wait_time(now))
+        if wait > self.max_wait:
+            self.rejected += 1
+            return False
+        bucket.take(now)
+        self.global_bucket.take(now)
+        self.admitted += 1
+        if wait > 0:
+            self.delayed += 1
+            await asyncio.sleep(wait)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "global_tokens": self.global_bucket.tokens,
+            "tracked_users": len(self._users),
+        }
+
+
+limiter = RateLimiter(
+    RATE_USER_PER_MIN / 60, RATE_USER_BURST, RATE_GLOBAL_PER_SEC, RATE_GLOBAL_BURST, RATE_MAX_WAIT_SEC
+)
@@ -0,0 +1,87 @@
+"""Shazam natijalari cache: Telegram file_unique_id, media id yoki audio (PCM) hash bo'yicha (SQLite + xotira)."""
+import hashlib
+import json
+import logging
+
+from config import SHAZAM_CACHE_TTL_SEC, SHAZAM_NEGATIVE_TTL_SEC
+from database import get_db
+from utils.executors import postprocess_pool
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "shazam_result"
+
+# Tez-tez forward qilinadigan kliplar uchun SQLite ga ham bormaslik
+_memory = TTLCache(2000, SHAZAM_NEGATIVE_TTL_SEC)
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+
+def file_key(file_unique_id: str) -> str:
+    """Telegram fayli – yuklab olishdan oldin ma'lum."""
+    return f"tg:{file_unique_id}"
+
+
+def media_key(platform: str, media_id: str) -> str:
+    """Havola (YouTube id, Instagram shortcode, ...)."""
+    return f"url:{platform}:{media_id}"
+
+
+async def pcm_key(pcm: memoryview | bytes) -> str:
+    """
+    Decode qilingan audio (16 kHz mono PCM) bo'yicha: boshqa havola, bir xil ovoz. Fayl baytlari emas –
+    bot yozgan muqova/teglar yoki konteyner farqi kalitni o'zgartirmaydi. Hash postprocess_pool da.
+    """
+    return f"pcm:{await postprocess_pool.run(_sha256, pcm)}"
+
+
+def _sha256(data: memoryview | bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+async def lookup(*keys: str | None) -> tuple[bool, dict | None]:
+    """
+    Birinchi topilgan kalit natijasi. Returns (hit, track):
+    hit=True, track=None – avval "topilmadi" bo'lgan (negativ natija hali eskirmagan).
+    """
+    for key in keys:
+        if not key:
+            continue
+        if key in _memory:
+            return _count_hit(_memory.get(key))
+        try:
+            raw = await get_db().kv_get(NAMESPACE, key)
+        except Exception as e:
+            logger.error("recognition_cache lookup: %s", e)
+            raw = None
+        if raw is not None:
+            track = json.loads(raw)
+            _memory.set(key, track)
+            return _count_hit(track)
+    _stats["misses"] += 1
+    return False, None
+
+
+def _count_hit(track: dict | None) -> tuple[bool, dict | None]:
+    _stats["hits" if track else "negative_hits"] += 1
+    return True, track
+
+
+async def store(track: dict | None, *keys: str | None) -> None:
+    """Natijani barcha kalitlar bo'yicha saqlash; None (topilmadi) qisqa TTL bilan."""
+    ttl = SHAZAM_CACHE_TTL_SEC if track else SHAZAM_NEGATIVE_TTL_SEC
+    raw = json.dumps(track)
+    for key in keys:
+        if not key:
+            continue
+        _memory.set(key, track, ttl=min(ttl, SHAZAM_NEGATIVE_TTL_SEC))
+        try:
+            await get_db().kv_set(NAMESPACE, key, raw, ttl)
+        except Exception as e:
+            logger.error("recognition_cache store: %s", e)
+
+
+def stats() -> dict:
+    total = _stats["hits"] + _stats["negative_hits"] + _stats["misses"]
+    hits = _stats["hits"] + _stats["negative_hits"]
+    return {**_stats, "hit_ratio": hits / total if total else 0.0, "memory_size": len(_memory)}
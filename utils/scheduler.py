@@ -0,0 +1,137 @@
+"""
+Adolatli navbat (fair-share): har bir user o'z navbatiga ega, userlar orasida round-robin,
+ustuvorlik sinflari (tezkor audio > katta video). Vazifa faqat global va user limiti ikkalasi bo'sh bo'lganda qabul qilinadi.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """Kichik qiymat – yuqori ustuvorlik."""
+    AUDIO = 0
+    VIDEO = 1
+
+
+@dataclass
+class Ticket:
+    """Navbat telemetriyasi: navbatga kirgandagi o'rni va kutish vaqti."""
+    user_id: int
+    priority: Priority
+    position: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    admitted_at: float | None = None
+    _future: asyncio.Future | None = field(default=None, repr=False)
+
+    @property
+    def wait_sec(self) -> float:
+        end = self.admitted_at if self.admitted_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+
+class FairScheduler:
+    def __init__(self, global_limit: int, user_limit: int):
+        self._global_limit = max(1, global_limit)
+        self.user_limit = max(1, user_limit)
+        # priority -> user_id -> navbat (OrderedDict tartibi = round-robin navbati)
+        self._queues: dict[Priority, OrderedDict[int, deque[Ticket]]] = {p: OrderedDict() for p in Priority}
+        self._running = 0
+        self._user_running: dict[int, int] = {}
+        self.admitted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def global_limit(self) -> int:
+        return self._global_limit
+
+    @global_limit.setter
+    def global_limit(self, value: int) -> None:
+        self._global_limit = max(1, value)
+        self._dispatch()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def queued(self) -> int:
+        return sum(len(q) for users in self._queues.values() for q in users.values())
+
+    async def acquire(self, user_id: int, priority: Priority = Priority.AUDIO) -> Ticket:
+        ticket = Ticket(user_id, priority, position=self.queued())
+        ticket._future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append(ticket)
+        self._dispatch()
+        try:
+            await ticket._future
+        except asyncio.CancelledError:
+            if ticket.admitted_at is not None:
+                self.release(ticket)
+            else:
+                self._remove(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        self._running -= 1
+        left = self._user_running.get(ticket.user_id, 1) - 1
+        if left > 0:
+            self._user_running[ticket.user_id] = left
+        else:
+            self._user_running.pop(ticket.user_id, None)
+        self._dispatch()
+
+    def _remove(self, ticket: Ticket) -> None:
+        users = self._queues[ticket.priority]
+        q = users.get(ticket.user_id)
+        if q is None:
+            return
+        try:
+            q.remove(ticket)
+        except ValueError:
+            pass
+        if not q:
+            del users[ticket.user_id]
+
+    def _next(self) -> Ticket | None:
+        for priority in Priority:
+            users = self._queues[priority]
+            for user_id in list(users):
+                if self._user_running.get(user_id, 0) >= self.user_limit:
+                    continue
+                q = users[user_id]
+                ticket = q.popleft()
+                if q:
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                return ticket
+        return None
+
+    def _dispatch(self) -> None:
+        while self._running < self._global_limit:
+            ticket = self._next()
+            if ticket is None:
+                return
+            self._running += 1
+            self._user_running[ticket.user_id] = self._user_running.get(ticket.user_id, 0) + 1
+            ticket.admitted_at = time.monotonic()
+            self.admitted += 1
+            self.wait_total += ticket.wait_sec
+            self.wait_max = max(self.wait_max, ticket.wait_sec)
+            ticket._future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "global_limit": self._global_limit,
+            "user_limit": self.user_limit,
+            "running": self._running,
+            "queued": self.queued(),
+            "queued_by_priority": {p.name.lower(): sum(len(q) for q in self._queues[p].values()) for p in Priority},
+            "active_users": len(self._user_running),
+            "admitted": self.admitted,
+            "wait_avg_sec": self.wait_total / self.admitted if self.admitted else 0.0,
+            "wait_max_sec": self.wait_max,
+        }
@@ -1,15 +1,17 @@
 """Shazam natijasini saqlash – shazam va youtube_mp3 (link → qo'shiqni topish) uchun."""
+from config import STATE_MEMORY_SIZE, STATE_TTL_SEC, STATE_PERSIST
+from utils.state_store import StateStore
 
-_shazam_cache: dict[str, dict] = {}
+_shazam_cache = StateStore("shazam_track", STATE_MEMORY_SIZE, STATE_TTL_SEC, persist=STATE_PERSIST)
 
 
 def get_cache_key(user_id: int, track_id: str) -> str:
     return f"{user_id}:{track_id}"
 
 
-def set_track(user_id: int, track_id: str, track: dict) -> None:
-    _shazam_cache[get_cache_key(user_id, track_id)] = track
+async def set_track(user_id: int, track_id: str, track: dict) -> None:
+    await _shazam_cache.set(get_cache_key(user_id, track_id), track)
 
 
-def get_track(user_id: int, track_id: str) -> dict | None:
-    return _shazam_cache.get(get_cache_key(user_id, track_id))
+async def get_track(user_id: int, track_id: str) -> dict | None:
+    return await _shazam_cache.get(get_cache_key(user_id, track_id))
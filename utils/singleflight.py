@@ -0,0 +1,46 @@
+"""Single-flight: bir xil kalit bo'yicha parallel so'rovlar bitta ishni kutadi (request coalescing)."""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Birinchi chaqiruvchi (leader) factory() ni bajaradi, qolganlar uning natijasini kutadi.
+    run() -> (natija, leader_mi). Leader xatosi kutayotganlarga ham uzatiladi.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut), False
+
+        fut = asyncio.get_running_loop().create_future()
+        # Kutayotgan bo'lmasa "exception was never retrieved" ogohlantirishi chiqmasin
+        fut.add_done_callback(lambda f: f.exception())
+        self._inflight[key] = fut
+        self.leaders += 1
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            fut.set_exception(RuntimeError("single-flight leader cancelled"))
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result, True
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
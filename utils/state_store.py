@@ -0,0 +1,60 @@
+"""Kalit → holat ombori: xotirada TTL + LRU (hajmi cheklangan), ixtiyoriy SQLite spill-over (restartdan keyin ham)."""
+import json
+import logging
+from typing import Any
+
+from database import get_db
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """
+    Xotirada faqat maxsize ta eng so'nggi yozuv saqlanadi. persist=True bo'lsa har bir yozuv
+    kv_cache jadvaliga ham yoziladi – xotiradan chiqarilgan yoki restartdan keyingi so'rovlar SQLite dan o'qiladi.
+    Qiymatlar JSON ga aylantiriladigan bo'lishi kerak.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float, persist: bool = True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.persist = persist
+        self._memory = TTLCache(maxsize, ttl)
+
+    async def get(self, key: str) -> Any | None:
+        value = self._memory.get(key)
+        if value is not None or not self.persist:
+            return value
+        try:
+            raw = await get_db().kv_get(self.namespace, key)
+        except Exception as e:
+            logger.error("state_store %s get: %s", self.namespace, e)
+            return None
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        self._memory.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._memory.set(key, value)
+        if not self.persist:
+            return
+        try:
+            await get_db().kv_set(self.namespace, key, json.dumps(value), self.ttl)
+        except Exception as e:
+            logger.error("state_store %s set: %s", self.namespace, e)
+
+    async def pop(self, key: str) -> Any | None:
+        value = await self.get(key)
+        self._memory.pop(key)
+        if self.persist:
+            try:
+                await get_db().kv_delete(self.namespace, key)
+            except Exception as e:
+                logger.error("state_store %s pop: %s", self.namespace, e)
+        return value
+
+    def stats(self) -> dict:
+        return {"namespace": self.namespace, **self._memory.stats()}
@@ -1,10 +1,10 @@
 """Download Telegram file to local path; optional video -> audio for Shazam."""
-import asyncio
 import subprocess
 from pathlib import Path
 from typing import Optional
 
 from config import TEMP_DIR
+from utils.executors import postprocess_pool
 
 
 async def download_telegram_file(bot, file_id: str, user_id: int, ext: str = "ogg") -> Optional[Path]:
@@ -48,12 +48,8 @@ async def get_audio_path_for_shazam(bot, file_id: str, user_id: int, is_video: b
     if not path or not path.exists():
         return None
     if is_video:
-        loop = asyncio.get_event_loop()
         audio_path = path.with_suffix(".mp3")
-        ok = await loop.run_in_executor(
-            None,
-            lambda: extract_audio_from_video(path, audio_path),
-        )
+        ok = await postprocess_pool.run(extract_audio_from_video, path, audio_path)
         if ok:
             return audio_path
         return path  # try original
@@ -0,0 +1,124 @@
+"""
+Vazifa bo'yicha bosqichlar vaqti: trace() bitta vazifani (handler yoki worker job) o'raydi, span() esa uning
+bosqichlarini (navbat, extract, yuklash, ffmpeg, aniqlash, upload). Tugaganda bitta JSON qator "trace" loggerga
+yoziladi. Faqat TRACE_SAMPLE_RATE ulushi yoziladi; trace yo'q bo'lsa span() deyarli bepul.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import TRACE_SAMPLE_RATE
+
+trace_logger = logging.getLogger("trace")
+# Asosiy logging ERROR darajasida – trace qatorlari baribir chiqishi uchun
+trace_logger.setLevel(logging.INFO)
+
+
+class Trace:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.spans: list[dict] = []
+        self.started = time.monotonic()
+
+
+_current: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+def annotate(**attrs) -> None:
+    """Joriy trace ga qo'shimcha maydonlar (masalan job_id, platform)."""
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """
+    Vazifa chegarasi. Ichma-ich chaqirilsa tashqi trace davom etadi (maydonlar qo'shiladi).
+    Bosqichsiz trace (masalan /start) yozilmaydi.
+    """
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+        yield current
+        return
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        yield None
+        return
+    current = Trace(name, attrs)
+    token = _current.set(current)
+    status = "error"
+    try:
+        yield current
+        status = "ok"
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        if current.spans:
+            _emit(current, status)
+
+
+def _emit(current: Trace, status: str) -> None:
+    try:
+        trace_logger.info(json.dumps({
+            "trace": current.name,
+            **current.attrs,
+            "status": status,
+            "total_ms": round((time.monotonic() - current.started) * 1000, 1),
+            "stages": current.spans,
+        }, ensure_ascii=False, default=str))
+    except Exception:
+        pass
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Bosqich: davomiylik (ms), xato turi va yield qilingan dict ga yozilgan qiymatlar (bytes va h.k.).
+    Trace faol bo'lmasa – vaqt o'lchanmaydi, dict tashlab yuboriladi.
+    """
+    current = _current.get()
+    record = {"stage": stage, **attrs}
+    if current is None:
+        yield record
+        return
+    started = time.monotonic()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["ms"] = round((time.monotonic() - started) * 1000, 1)
+        current.spans.append(record)
+
+
+def watch_ydl(opts: dict, record: dict) -> None:
+    """
+    yt-dlp progress hook: birinchi bayt kelguncha o'tgan vaqt (extract_ms) va yuklangan baytlar span ga yoziladi.
+    Trace faol bo'lmasa hook qo'shilmaydi.
+    """
+    if not active():
+        return
+    started = time.monotonic()
+    done: dict[str, int] = {}
+
+    def hook(d: dict) -> None:
+        if d.get("status") == "downloading" and "extract_ms" not in record:
+            record["extract_ms"] = round((time.monotonic() - started) * 1000, 1)
+        if d.get("status") in ("downloading", "finished"):
+            done[d.get("filename") or ""] = d.get("downloaded_bytes") or d.get("total_bytes") or 0
+            record["bytes"] = sum(done.values())
+
+    opts["progress_hooks"] = [*opts.get("progress_hooks", []), hook]
+
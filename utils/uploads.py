@@ -0,0 +1,81 @@
+"""
+Diskdan Telegramga yuborish: fayl har doim FSInputFile orqali bo'laklab o'qiladi (xotiraga to'liq yuklanmaydi),
+bir vaqtda yuborilayotgan baytlar esa umumiy budjet bilan cheklanadi – bir nechta katta fayl birdan tayyor
+bo'lsa ular navbat kutadi, jarayon OOM bo'lmaydi.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
+
+from aiogram.types import FSInputFile
+
+from config import UPLOAD_BYTES_BUDGET
+from utils import metrics, tracing
+
+T = TypeVar("T")
+
+
+class ByteBudget:
+    """Bir vaqtdagi baytlar chegarasi. Budjetdan katta fayl budjet bo'shaganda yolg'iz o'tadi."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak = 0
+        self._cond: asyncio.Condition | None = None
+
+    def _get_cond(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        size = min(max(0, size), self.limit)
+        cond = self._get_cond()
+        async with cond:
+            self.waiting += 1
+            try:
+                await cond.wait_for(lambda: self.in_flight + size <= self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += size
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            async with cond:
+                self.in_flight -= size
+                cond.notify_all()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting, "peak": self.peak}
+
+
+upload_budget = ByteBudget(UPLOAD_BYTES_BUDGET)
+
+
+async def send_from_disk(
+    path: Path,
+    send: Callable[[FSInputFile], Awaitable[T]],
+    filename: str | None = None,
+    platform: str = "Other",
+) -> T:
+    """send(FSInputFile) ni budjet doirasida chaqirish. Masalan: lambda f: bot.send_audio(chat_id, f)."""
+    size = path.stat().st_size
+    with tracing.span("upload", platform=platform, bytes=size) as span:
+        waited = time.monotonic()
+        async with upload_budget.reserve(size):
+            started, status = time.monotonic(), "error"
+            span["budget_wait_ms"] = round((started - waited) * 1000, 1)
+            try:
+                result = await send(FSInputFile(path, filename=filename or path.name))
+                status = "ok"
+                return result
+            finally:
+                metrics.stage_seconds.observe(
+                    time.monotonic() - started, stage="upload", platform=platform, status=status
+                )
@@ -0,0 +1,61 @@
+"""
+Yuklash worker jarayoni: JOB_QUEUE=1 bo'lganda bot vazifalarni SQLite jobs jadvaliga yozadi, bu jarayon esa
+ularni lease bilan olib bajaradi va natijani Telegramga yuboradi. Bir serverda bir nechta ishga tushirish mumkin:
+    python worker.py
+"""
+import asyncio
+import logging
+import os
+import socket
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.client.default import DefaultBotProperties
+
+from config import BOT_TOKEN, FFMPEG_LOCATION, JOB_WORKER_CONCURRENCY, METRICS_PORT
+from database import get_db
+import handlers  # noqa: F401 – vazifa bajaruvchilarini (jobs.runner) ro'yxatdan o'tkazadi
+from utils import executors, jobs, metrics
+
+logging.basicConfig(
+    level=logging.ERROR,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+)
+
+if FFMPEG_LOCATION:
+    ffmpeg_dir = os.path.dirname(FFMPEG_LOCATION)
+    if ffmpeg_dir and ffmpeg_dir not in os.environ.get("PATH", ""):
+        os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
+
+
+async def run() -> None:
+    bot = Bot(
+        token=BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    db = get_db()
+    await db.connect()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    # Bir serverda bir nechta worker bo'lsa – har biriga alohida METRICS_PORT
+    runner = await metrics.start_server(METRICS_PORT) if METRICS_PORT > 0 else None
+    try:
+        await jobs.work(bot, worker_id, JOB_WORKER_CONCURRENCY)
+    finally:
+        if runner:
+            await runner.cleanup()
+        await db.close()
+        await bot.session.close()
+        executors.shutdown()
+
+
+def main() -> None:
+    if not BOT_TOKEN:
+        raise ValueError("BOT_TOKEN is required. Set it in .env")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()